@@ -0,0 +1,143 @@
+# api/assistant.py
+"""
+Retrieval-grounded answers for the compliance chatbot
+
+The prompt holds only the clauses most similar to the question, found with
+the persisted clause index of a MatchEngine, and is cut to a token budget
+so it always fits the generator's context window. Answers are kept in a
+bounded LRU cache keyed by the question and the regulation library
+fingerprint, so repeated questions skip generation.
+"""
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from dotenv import load_dotenv
+from api.match_engine import MatchEngine
+from api.model_registry import GENERATOR_NAME, get_generator
+from api.regulation_store import as_store
+
+# Load environment variables
+load_dotenv()
+
+CHATBOT_TOP_K = int(os.getenv('CHATBOT_TOP_K', '5'))
+CHATBOT_CONTEXT_TOKENS = int(os.getenv('CHATBOT_CONTEXT_TOKENS', '600'))
+CHATBOT_MAX_NEW_TOKENS = int(os.getenv('CHATBOT_MAX_NEW_TOKENS', '120'))
+CHATBOT_CACHE_SIZE = int(os.getenv('CHATBOT_CACHE_SIZE', '256'))
+
+PREAMBLE = "You are a compliance expert helping a multinational bank. Here are relevant regulations:"
+
+
+class ComplianceAssistant:
+    """
+    Answers compliance questions from the top_k clauses relevant to them
+    Args:
+        generator: transformers text-generation pipeline (the shared one for GENERATOR_NAME by default)
+        engine: MatchEngine whose clause index is used for retrieval
+        context_tokens: Upper bound on clause tokens in the prompt
+        cache_size: Answers kept in the response cache (0 disables it)
+    """
+
+    def __init__(self, generator=None, engine: Optional[MatchEngine] = None, top_k: int = CHATBOT_TOP_K,
+                 context_tokens: int = CHATBOT_CONTEXT_TOKENS, max_new_tokens: int = CHATBOT_MAX_NEW_TOKENS,
+                 cache_size: int = CHATBOT_CACHE_SIZE, model_name: str = GENERATOR_NAME):
+        self.generator = generator
+        self.model_name = model_name
+        # One-off questions are not worth a slot in the document embedding cache
+        self.engine = engine or MatchEngine(use_cache=False)
+        self.top_k = top_k
+        self.context_tokens = context_tokens
+        self.max_new_tokens = max_new_tokens
+        self.cache_size = cache_size
+        self._responses: "OrderedDict[tuple, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _generator(self):
+        if self.generator is None:
+            self.generator = get_generator(self.model_name)
+        return self.generator
+
+    def retrieve(self, question: str, regulations, top_k: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Clauses most similar to the question, best first"""
+        results = self.engine.match_controls_to_regulations([question], regulations, top_k=top_k or self.top_k)
+        return results[0]["matches"] if results else []
+
+    def build_prompt(self, question: str, matches: List[Dict[str, Any]]) -> str:
+        """Prompt with the question (cut if too long) and as many retrieved clauses as fit the token budget"""
+        tokenizer = self._generator().tokenizer
+        count = lambda text: len(tokenizer.encode(text))
+
+        # The whole prompt plus the answer must fit the model's context window
+        window = getattr(tokenizer, 'model_max_length', 1024)
+        window = 1024 if window > 100000 else window  # tokenizers without a limit report a huge sentinel
+        available = window - self.max_new_tokens - count(PREAMBLE) - count("\n\nQuestion: \n\nAnswer:")
+        # A long question is cut so at least half of the rest (up to context_tokens) is left for clauses
+        question_tokens = tokenizer.encode(question)
+        question_limit = max(0, available - min(self.context_tokens, available // 2))
+        if len(question_tokens) > question_limit:
+            question = tokenizer.decode(question_tokens[:question_limit])
+        question_part = f"\n\nQuestion: {question}\n\nAnswer:"
+        budget = min(self.context_tokens,
+                     window - self.max_new_tokens - count(PREAMBLE) - count(question_part))
+
+        lines = []
+        used = 0
+        for match in matches:
+            line = f"\n- {match['regulation']} {match['clause_id']}: {match['clause_text']}"
+            tokens = count(line)
+            if used + tokens > budget:
+                if not lines and budget > 0:
+                    # Keep a truncated best clause rather than no context at all
+                    lines.append(tokenizer.decode(tokenizer.encode(line)[:budget]))
+                break
+            lines.append(line)
+            used += tokens
+        return PREAMBLE + "".join(lines) + question_part
+
+    def answer(self, question: str, regulations) -> str:
+        """Answer a question, from the response cache when it was asked before"""
+        question = re.sub(r'\s+', ' ', question).strip()
+        store = as_store(regulations)
+        key = (self.model_name, store.fingerprint, self.top_k, question.lower())
+        with self._lock:
+            if key in self._responses:
+                self._responses.move_to_end(key)
+                return self._responses[key]
+
+        prompt = self.build_prompt(question, self.retrieve(question, store))
+        generator = self._generator()
+        generated = generator(
+            prompt,
+            max_new_tokens=self.max_new_tokens,
+            do_sample=True,
+            return_full_text=False,
+            pad_token_id=generator.tokenizer.eos_token_id
+        )[0]['generated_text']
+        response = generated.split("Question:")[0].strip()
+
+        if self.cache_size > 0:
+            with self._lock:
+                self._responses[key] = response
+                self._responses.move_to_end(key)
+                while len(self._responses) > self.cache_size:
+                    self._responses.popitem(last=False)
+        return response
+
+    def clear_cache(self) -> None:
+        with self._lock:
+            self._responses.clear()
+
+
+_assistant: Optional[ComplianceAssistant] = None
+_assistant_lock = threading.Lock()
+
+
+def get_assistant() -> ComplianceAssistant:
+    """Process-wide assistant, so Streamlit reruns share the generator and the response cache"""
+    global _assistant
+    if _assistant is None:
+        with _assistant_lock:
+            if _assistant is None:
+                _assistant = ComplianceAssistant()
+    return _assistant
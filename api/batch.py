@@ -0,0 +1,438 @@
+# api/batch.py
+"""
+Headless batch compliance runs, sharded across worker processes
+
+    python -m api.batch "controls/**/*.pdf" controls/mumbai --company Acme --branch Mumbai
+    python -m api.batch controls/ --branch-from-path --workers 8 --output results.jsonl
+    python -m api.batch controls/ --output results/ --format parquet --regulations regs.json
+
+Inputs are files, directories (searched recursively for .pdf/.docx/.txt) or
+globs. Files are split into batches that a pool of worker processes picks
+up; every worker loads the regulations and the encoder once and keeps them
+for all of its batches. Results are streamed as batches finish:
+
+    db       documents and matches are written to DB_PATH (--db) by the workers
+    jsonl    one line per document, appended to --output
+    parquet  one part file per batch in the --output directory (requires pyarrow)
+
+A checkpoint file records every finished batch once its results are
+written. Re-running the same command skips the files it lists, so a crashed
+run resumes where it stopped (a batch cut off between writing and recording
+is written again); pass --fresh to start over. A run that finishes marks its
+checkpoint complete, so the next run (e.g. the next night's) starts a new
+one. The checkpoint also records the regulation library fingerprint and the
+encoder, and resuming after either changed is refused. A batch that fails to
+store or match reports its files as errors and the run goes on; database
+output reuses the document rows a crashed attempt already inserted.
+"""
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.txt')
+OUTPUT_FORMATS = ('db', 'jsonl', 'parquet')
+
+# Per-worker state, set by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def expand_inputs(inputs: List[str]) -> List[str]:
+    """Sorted, de-duplicated control files from file paths, directories and globs"""
+    paths = set()
+    for pattern in inputs:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                paths.update(os.path.join(root, name) for name in files)
+        elif os.path.isfile(pattern):
+            paths.add(pattern)
+        else:
+            paths.update(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(os.path.abspath(path) for path in paths if path.lower().endswith(SUPPORTED_EXTENSIONS))
+
+
+def _init_worker(regulations_path: str, options: Dict[str, Any]) -> None:
+    """Load the regulations and the encoder once per worker process"""
+    from api.match_engine import MatchEngine
+    from api.regulation_loader import RegulationLoader
+
+    if options.get('threads'):
+        try:
+            import torch
+            torch.set_num_threads(options['threads'])
+        except ImportError:
+            pass
+    loader = RegulationLoader()
+    loader.regulations_path = regulations_path
+    _worker['store'] = loader.load_store()
+    _worker['engine'] = MatchEngine(use_cache=options.get('use_cache', True))
+    _worker['options'] = options
+
+
+def _prepare_index(scopes: List[Optional[List[str]]]) -> int:
+    """Encode the clauses every batch will need once, before the batches start"""
+    engine, store = _worker['engine'], _worker['store']
+    names = None
+    if all(scope is not None for scope in scopes):
+        names = sorted({name for scope in scopes for name in store.resolve_scope(scope)})
+    engine.clause_index.build(store, scope=names)
+    return len(store)
+
+
+def _process_batch(batch: List[Tuple[str, str]]) -> Dict[str, Any]:
+    """
+    Extract, store (db output) and match one batch of (path, branch) files
+    Returns:
+        {files, errors, documents} where documents hold compact results for file outputs
+    """
+    from api import document_parser
+    from api.regulation_loader import branch_scope
+
+    engine, store, options = _worker['engine'], _worker['store'], _worker['options']
+    errors = []
+    documents = []
+    for path, branch in batch:
+        try:
+            text, page_offsets = document_parser.join_pages(document_parser.extract_pages_from_file(path))
+        except Exception as e:
+            errors.append({'path': path, 'error': str(e)})
+            continue
+        if text.strip():
+            documents.append({'id': None, 'text': text, 'page_offsets': page_offsets,
+                              'path': path, 'branch': branch})
+
+    if options['format'] == 'db' and documents:
+        try:
+            _store_documents(documents, options['company'])
+        except Exception as e:
+            errors.extend({'path': doc['path'], 'error': f"Failed to store {doc['path']}: {e}"} for doc in documents)
+            documents = []
+
+    # One match call per branch in the batch, since scope follows the branch
+    output = []
+    for branch in dict.fromkeys(doc['branch'] for doc in documents):
+        group = [doc for doc in documents if doc['branch'] == branch]
+        scope = options['scope'] if options['scope'] is not None else branch_scope(branch)
+        try:
+            results = engine.match_documents(group, store, top_k=options['top_k'], scope=scope)
+            if options['format'] == 'db':
+                engine.save_results(results)
+        except Exception as e:
+            errors.extend({'path': doc['path'], 'error': f"Failed to match {doc['path']}: {e}"} for doc in group)
+            continue
+        if options['format'] == 'db':
+            continue
+        for doc, result in zip(group, results):
+            output.append({
+                'path': doc['path'],
+                'company': options['company'],
+                'branch': branch,
+                'matches': [{key: match[key] for key in (
+                    'regulation', 'clause_id', 'similarity_score', 'chunk_index', 'page', 'char_offset'
+                )} for match in result['matches']]
+            })
+    return {'files': [path for path, _ in batch], 'errors': errors, 'documents': output}
+
+
+def _store_documents(documents: List[Dict[str, Any]], company: str) -> None:
+    """
+    Insert documents and set their ids, reusing the row of a file already stored with the
+    same text, company and branch (e.g. by an attempt that crashed before its checkpoint).
+    Results of reused rows are dropped, since the batch saves them again.
+    """
+    from api import db, document_parser
+    from api.embedding_index import text_sha256
+
+    document_parser.init_db()
+    conn = db.get_connection(document_parser.DB_PATH)
+    new, reused = [], []
+    for doc in documents:
+        row = conn.execute(
+            'SELECT id FROM documents WHERE text_hash = ? AND stored_path = ? AND company_name = ? '
+            'AND branch_location = ? ORDER BY id DESC LIMIT 1',
+            (text_sha256(doc['text']), doc['path'], company, doc['branch'])
+        ).fetchone()
+        if row is None:
+            new.append(doc)
+        else:
+            doc['id'] = row[0]
+            reused.append((row[0],))
+    if reused:
+        with conn:
+            conn.executemany('DELETE FROM processing_results WHERE document_id = ?', reused)
+    if new:
+        doc_ids = document_parser.save_documents_metadata([{
+            'company': company,
+            'branch': doc['branch'],
+            'filename': os.path.basename(doc['path']),
+            'filepath': doc['path'],
+            'text': doc['text']
+        } for doc in new])
+        for doc, doc_id in zip(new, doc_ids):
+            doc['id'] = doc_id
+
+
+class Checkpoint:
+    """
+    Append-only record of finished files for one run configuration
+    The first line stores the configuration; resuming with a different one is refused.
+    A checkpoint marked complete by finish() is replaced by a new one.
+    """
+
+    def __init__(self, path: str, config: Dict[str, Any], fresh: bool = False):
+        self.path = path
+        self.done = set()
+        config_line = json.dumps({'config': config}, sort_keys=True)
+        if fresh and os.path.exists(path):
+            os.remove(path)
+        complete = False
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                header = f.readline().strip()
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # a line cut short by a crash
+                    if entry.get('complete'):
+                        complete = True
+                        break
+                    self.done.update(entry.get('files', []))
+            if complete:
+                self.done = set()
+            elif header and header != config_line:
+                raise ValueError(f"Checkpoint {path} belongs to a different run; use --fresh to start over")
+        if complete or not os.path.exists(path):
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(path, 'w') as f:
+                f.write(config_line + '\n')
+        self.resumed = bool(self.done)
+
+    def record(self, files: List[str]) -> None:
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'files': files}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(files)
+
+    def finish(self) -> None:
+        """Mark the run complete, so the next one starts over instead of resuming"""
+        with open(self.path, 'a') as f:
+            f.write(json.dumps({'complete': True}) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class JsonlOutput:
+    def __init__(self, path: str, append: bool):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        if append and os.path.exists(path):
+            # Drop a last line cut short by a crash
+            with open(path, 'rb+') as f:
+                data = f.read()
+                f.truncate(data.rfind(b'\n') + 1)
+        self.f = open(path, 'a' if append else 'w')
+
+    def write(self, batch_id: str, documents: List[Dict[str, Any]]) -> None:
+        for document in documents:
+            self.f.write(json.dumps(document) + '\n')
+        self.f.flush()
+        os.fsync(self.f.fileno())
+
+    def close(self) -> None:
+        self.f.close()
+
+
+class ParquetOutput:
+    """One part file per batch, named after the batch so a re-run batch replaces its file"""
+
+    def __init__(self, directory: str, append: bool):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError("Parquet output requires pyarrow: pip install pyarrow")
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        if not append:
+            for name in os.listdir(directory):
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    os.remove(os.path.join(directory, name))
+
+    def write(self, batch_id: str, documents: List[Dict[str, Any]]) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        rows = [
+            dict({'path': doc['path'], 'company': doc['company'], 'branch': doc['branch']}, **match)
+            for doc in documents for match in doc['matches']
+        ]
+        columns = ('path', 'company', 'branch', 'regulation', 'clause_id',
+                   'similarity_score', 'chunk_index', 'page', 'char_offset')
+        table = pa.table({column: [row[column] for row in rows] for column in columns})
+        path = os.path.join(self.directory, f'part-{batch_id}.parquet')
+        pq.write_table(table, path + '.tmp')
+        os.replace(path + '.tmp', path)
+
+    def close(self) -> None:
+        pass
+
+
+class DbOutput:
+    """Workers write to the database themselves; nothing is left for the parent"""
+
+    def write(self, batch_id: str, documents: List[Dict[str, Any]]) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+def run(paths: List[str], branches: List[str], regulations_path: str, options: Dict[str, Any],
+        output: Optional[str] = None, checkpoint_path: Optional[str] = None, workers: int = 1,
+        batch_size: int = 32, fresh: bool = False, log=print) -> Dict[str, Any]:
+    """
+    Match files in batches on a process pool and stream the results out
+    Returns:
+        Run summary: files, skipped (already in the checkpoint), errors, seconds
+    """
+    from api.encoders import encoder_key
+    from api.model_registry import CASCADE_ENCODER, MATCH_ENCODER, resolve_encoder
+    from api.regulation_loader import RegulationLoader
+
+    # Worker count, threads and caching may change between attempts; what is computed may not,
+    # including the regulation texts and the encoders that score them
+    loader = RegulationLoader()
+    loader.regulations_path = regulations_path
+    config = {key: options[key] for key in ('format', 'company', 'scope', 'top_k')}
+    config.update(
+        regulations=os.path.abspath(regulations_path), output=output,
+        fingerprint=loader.load_store().fingerprint,
+        encoder=encoder_key(*resolve_encoder(MATCH_ENCODER)),
+        cascade=encoder_key(*resolve_encoder(CASCADE_ENCODER)) if CASCADE_ENCODER else None
+    )
+    checkpoint = Checkpoint(checkpoint_path, config, fresh=fresh)
+    todo = [(path, branch) for path, branch in zip(paths, branches) if path not in checkpoint.done]
+    if options['format'] == 'jsonl':
+        sink = JsonlOutput(output, append=checkpoint.resumed)
+    elif options['format'] == 'parquet':
+        sink = ParquetOutput(output, append=checkpoint.resumed)
+    else:
+        sink = DbOutput()
+
+    summary = {'files': len(paths), 'skipped': len(paths) - len(todo), 'matched': 0, 'errors': []}
+    started = time.perf_counter()
+    batches = [todo[start:start + batch_size] for start in range(0, len(todo), batch_size)]
+    # Spawned workers do not inherit the parent's threads or open connections
+    context = multiprocessing.get_context('spawn')
+    try:
+        with ProcessPoolExecutor(max_workers=max(1, workers), mp_context=context,
+                                 initializer=_init_worker, initargs=(regulations_path, options)) as pool:
+            if batches:
+                scopes = [options['scope']] if options['scope'] is not None else \
+                    [_branch_scope(branch) for branch in dict.fromkeys(branches)]
+                pool.submit(_prepare_index, scopes).result()
+
+            # Keep a bounded number of batches in flight so results stream out in steady memory
+            pending = set()
+            queue = iter(batches)
+            for batch in queue:
+                pending.add(pool.submit(_process_batch, batch))
+                if len(pending) >= 2 * max(1, workers):
+                    break
+            while pending:
+                finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    result = future.result()
+                    batch_id = hashlib.sha256('\n'.join(result['files']).encode('utf-8')).hexdigest()[:16]
+                    sink.write(batch_id, result['documents'])
+                    checkpoint.record(result['files'])
+                    summary['matched'] += len(result['files']) - len(result['errors'])
+                    summary['errors'].extend(result['errors'])
+                    for error in result['errors']:
+                        log(error['error'])
+                    log(f"{len(checkpoint.done)}/{len(paths)} files done")
+                    batch = next(queue, None)
+                    if batch is not None:
+                        pending.add(pool.submit(_process_batch, batch))
+        checkpoint.finish()
+    finally:
+        sink.close()
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def _branch_scope(branch: str):
+    from api.regulation_loader import branch_scope
+    return branch_scope(branch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch compliance matching of control files")
+    parser.add_argument('inputs', nargs='+', help="Control files, directories or globs")
+    parser.add_argument('--regulations', default=os.getenv('REGULATIONS_PATH', 'data/regulations.json'))
+    parser.add_argument('--company', default='Unknown')
+    parser.add_argument('--branch', default='Headquarters', help="Branch of every file (sets the regulation scope)")
+    parser.add_argument('--branch-from-path', action='store_true',
+                        help="Use each file's parent directory name as its branch")
+    parser.add_argument('--scope', nargs='+', help="Regulation names or jurisdictions, overriding branch scopes")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, help="Default: from the --output suffix, else db")
+    parser.add_argument('--output', help="JSONL file or Parquet directory")
+    parser.add_argument('--db', help="SQLite database for db output (default DB_PATH)")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--threads', type=int, help="Encoder threads per worker (default cores / workers)")
+    parser.add_argument('--batch-size', type=int, default=32, help="Files per work unit")
+    parser.add_argument('--checkpoint', help="Default: <output>.checkpoint.jsonl, or data/batch.checkpoint.jsonl")
+    parser.add_argument('--fresh', action='store_true', help="Ignore an existing checkpoint and overwrite output")
+    parser.add_argument('--no-cache', action='store_true', help="Do not use the document embedding cache")
+    args = parser.parse_args()
+
+    output_format = args.format
+    if output_format is None:
+        suffix = os.path.splitext(args.output or '')[1].lower()
+        output_format = {'.jsonl': 'jsonl', '.parquet': 'parquet', '': 'db'}.get(suffix, 'jsonl') \
+            if args.output else 'db'
+    if output_format != 'db' and not args.output:
+        parser.error(f"--output is required for {output_format} output")
+    if args.db:
+        # Workers are spawned and read DB_PATH at import
+        os.environ['DB_PATH'] = args.db
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        parser.error("No .pdf, .docx or .txt files matched the inputs")
+    branches = [os.path.basename(os.path.dirname(path)) if args.branch_from_path else args.branch
+                for path in paths]
+    workers = max(1, min(args.workers, (len(paths) + args.batch_size - 1) // args.batch_size))
+    options = {
+        'format': output_format,
+        'company': args.company,
+        'scope': args.scope,
+        'top_k': args.top_k,
+        'threads': args.threads or max(1, (os.cpu_count() or 1) // workers),
+        'use_cache': not args.no_cache
+    }
+    checkpoint = args.checkpoint or (
+        f"{args.output.rstrip(os.sep)}.checkpoint.jsonl" if args.output else 'data/batch.checkpoint.jsonl'
+    )
+    log = lambda message: print(message, file=sys.stderr)
+    try:
+        summary = run(paths, branches, args.regulations, options, output=args.output, checkpoint_path=checkpoint,
+                      workers=workers, batch_size=args.batch_size, fresh=args.fresh, log=log)
+    except (ValueError, ImportError) as e:
+        sys.exit(str(e))
+    summary['errors'] = len(summary['errors'])
+    print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,131 @@
+# api/chunker.py
+import re
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+# all-MiniLM-L6-v2 truncates at 256 word pieces, roughly 190 English words
+DEFAULT_MAX_WORDS = 160
+DEFAULT_OVERLAP = 1
+
+# Blank line between pages/paragraphs so paragraph chunking can see unit boundaries
+PAGE_SEPARATOR = "\n\n"
+
+_PARAGRAPH_BREAK = re.compile(r'\n\s*\n')
+_SENTENCE_END = re.compile(r'(?<=[.!?;])\s+')
+
+
+def _split_units(text: str, mode: str) -> List[Tuple[int, str]]:
+    """Split text into (char_start, unit_text) paragraphs or sentences"""
+    if mode not in ('paragraph', 'sentence'):
+        raise ValueError(f"Unsupported chunk mode: {mode}")
+
+    units = []
+    pattern = _PARAGRAPH_BREAK if mode == 'paragraph' else _SENTENCE_END
+    start = 0
+    for match in pattern.finditer(text):
+        units.append((start, text[start:match.start()]))
+        start = match.end()
+    units.append((start, text[start:]))
+    return [(s, u) for s, u in units if u.strip()]
+
+
+def _split_long_unit(start: int, unit: str, max_words: int) -> List[Tuple[int, str]]:
+    """Break a unit longer than max_words into overlapping word windows"""
+    words = list(re.finditer(r'\S+', unit))
+    if len(words) <= max_words:
+        return [(start, unit)]
+
+    step = max(1, max_words - max_words // 5)
+    pieces = []
+    for i in range(0, len(words), step):
+        window = words[i:i + max_words]
+        pieces.append((start + window[0].start(), unit[window[0].start():window[-1].end()]))
+        if i + max_words >= len(words):
+            break
+    return pieces
+
+
+def iter_chunks(
+    pages: Iterable[Tuple[int, str]],
+    mode: str = 'paragraph',
+    max_words: int = DEFAULT_MAX_WORDS,
+    overlap: int = DEFAULT_OVERLAP
+) -> Iterator[Dict[str, Union[int, str]]]:
+    """
+    Yield overlapping chunks from a stream of (page, text) units
+    Only the current window of units is held in memory, so pages can come
+    straight from a generator over a very large file. char_offset is the
+    position the chunk would have in the pages joined with PAGE_SEPARATOR.
+    Args:
+        pages: Iterable of (page/paragraph index, text)
+        mode: 'paragraph' or 'sentence' units packed into each chunk
+        max_words: Upper bound on words per chunk
+        overlap: Number of trailing units repeated at the start of the next chunk
+    Yields:
+        Chunks with chunk_index, text, char_offset and page
+    """
+    joiner = PAGE_SEPARATOR if mode == 'paragraph' else ' '
+    window = []  # (char_offset, page, text, n_words)
+    window_words = 0
+    chunk_index = 0
+    position = 0
+
+    def make_chunk():
+        return {
+            'chunk_index': chunk_index,
+            'text': joiner.join(unit[2] for unit in window),
+            'char_offset': window[0][0],
+            'page': window[0][1]
+        }
+
+    for page, page_text in pages:
+        for start, unit in _split_units(page_text, mode):
+            for piece_start, piece in _split_long_unit(start, unit, max_words):
+                n_words = len(piece.split())
+                if window and window_words + n_words > max_words:
+                    yield make_chunk()
+                    chunk_index += 1
+                    window = window[-overlap:] if overlap > 0 else []
+                    window_words = sum(unit[3] for unit in window)
+                    # Drop carried units that would still overflow the window
+                    while window and window_words + n_words > max_words:
+                        window_words -= window[0][3]
+                        window = window[1:]
+                window.append((position + piece_start, int(page), piece, n_words))
+                window_words += n_words
+        position += len(page_text) + len(PAGE_SEPARATOR)
+
+    if window:
+        yield make_chunk()
+
+
+def split_pages(text: str, page_offsets: Optional[Sequence[Sequence[int]]] = None) -> List[Tuple[int, str]]:
+    """Recover (page, text) units from joined text and its [char_start, page] offsets"""
+    if not page_offsets:
+        return [(0, text)]
+
+    pages = []
+    for i, (start, page) in enumerate(page_offsets):
+        end = page_offsets[i + 1][0] - len(PAGE_SEPARATOR) if i + 1 < len(page_offsets) else len(text)
+        pages.append((int(page), text[int(start):int(end)]))
+    return pages
+
+
+def chunk_text(
+    text: str,
+    page_offsets: Optional[Sequence[Sequence[int]]] = None,
+    mode: str = 'paragraph',
+    max_words: int = DEFAULT_MAX_WORDS,
+    overlap: int = DEFAULT_OVERLAP
+) -> List[Dict[str, Union[int, str]]]:
+    """
+    Split a document into overlapping chunks that fit the embedding model
+    Args:
+        text: Full document text
+        page_offsets: Optional [char_start, page] pairs from the parser, sorted by char_start
+        mode: 'paragraph' or 'sentence' units packed into each chunk
+        max_words: Upper bound on words per chunk
+        overlap: Number of trailing units repeated at the start of the next chunk
+    Returns:
+        List of chunks with chunk_index, text, char_offset and page
+    """
+    return list(iter_chunks(split_pages(text, page_offsets), mode=mode, max_words=max_words, overlap=overlap))
@@ -0,0 +1,152 @@
+# api/db.py
+import os
+import sqlite3
+import threading
+from dotenv import load_dotenv
+from api.embedding_index import text_sha256
+
+# Load environment variables
+load_dotenv()
+
+DB_PATH = os.getenv('DB_PATH', 'data/compliance.db')
+
+# Applied to every new connection. WAL lets dashboard sessions read while a
+# batch run writes; NORMAL sync is durable across application crashes in WAL mode.
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA busy_timeout = 30000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",     # 64 MB page cache
+    "PRAGMA mmap_size = 268435456"    # 256 MB memory-mapped reads
+)
+
+_local = threading.local()
+_initialized = set()
+_init_lock = threading.Lock()
+
+
+def get_connection(db_path: str = DB_PATH) -> sqlite3.Connection:
+    """
+    Connection for the current thread, opened once per (process, thread, path)
+    Callers must not close it; use `with conn:` for a transaction.
+    """
+    connections = getattr(_local, 'connections', None)
+    if connections is None or _local.pid != os.getpid():
+        # Connections must not be shared with forked worker processes
+        connections = _local.connections = {}
+        _local.pid = os.getpid()
+
+    conn = connections.get(db_path)
+    if conn is None:
+        os.makedirs(os.path.dirname(db_path) or '.', exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=30)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        connections[db_path] = conn
+    return conn
+
+
+def close_connections() -> None:
+    """Close this thread's connections, e.g. at the end of a worker thread"""
+    connections = getattr(_local, 'connections', None) or {}
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+
+
+def _backfill_text_hashes(conn: sqlite3.Connection, batch_size: int = 500) -> None:
+    """Hash existing document texts in id order, a batch at a time"""
+    last_id = 0
+    while True:
+        rows = conn.execute(
+            'SELECT id, processed_text FROM documents WHERE id > ? ORDER BY id LIMIT ?',
+            (last_id, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        conn.executemany(
+            'UPDATE documents SET text_hash = ? WHERE id = ?',
+            [(text_sha256(text), doc_id) for doc_id, text in rows if text is not None]
+        )
+        last_id = rows[-1][0]
+
+
+def init_db(db_path: str = DB_PATH) -> None:
+    """Create tables and indexes once per process; later calls are free"""
+    if db_path in _initialized:
+        return
+
+    with _init_lock:
+        if db_path in _initialized:
+            return
+        try:
+            conn = get_connection(db_path)
+            cursor = conn.cursor()
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS documents (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    company_name TEXT NOT NULL,
+                    branch_location TEXT,
+                    original_filename TEXT NOT NULL,
+                    stored_path TEXT NOT NULL,
+                    upload_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    processed_text TEXT,
+                    file_size_kb INTEGER,
+                    file_type TEXT,
+                    text_hash TEXT
+                )
+            ''')
+            
+            # Databases created before text_hash existed get the column and a one-off backfill
+            columns = [row[1] for row in cursor.execute("PRAGMA table_info(documents)").fetchall()]
+            if 'text_hash' not in columns:
+                cursor.execute("ALTER TABLE documents ADD COLUMN text_hash TEXT")
+                _backfill_text_hashes(conn)
+            
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS processing_results (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    document_id INTEGER REFERENCES documents(id),
+                    regulation_name TEXT NOT NULL,
+                    clause_id TEXT NOT NULL,
+                    similarity_score REAL NOT NULL,
+                    processing_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY(document_id) REFERENCES documents(id)
+                )
+            ''')
+            
+            # Which regulation version each document was last scored against (incremental analysis)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS match_state (
+                    document_id INTEGER NOT NULL REFERENCES documents(id),
+                    regulation_name TEXT NOT NULL,
+                    regulation_version TEXT NOT NULL,
+                    model_name TEXT NOT NULL,
+                    scored_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (document_id, regulation_name)
+                )
+            ''')
+            
+            # Branch-filtered listings and per-document result lookups
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_documents_company_branch
+                ON documents(company_name, branch_location, upload_timestamp)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_documents_text_hash ON documents(text_hash)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_processing_results_document
+                ON processing_results(document_id, regulation_name)
+            ''')
+            cursor.execute('''
+                CREATE INDEX IF NOT EXISTS idx_match_state_regulation
+                ON match_state(regulation_name)
+            ''')
+            conn.commit()
+            _initialized.add(db_path)
+        except Exception as e:
+            raise Exception(f"Database initialization failed: {str(e)}")
@@ -1,11 +1,18 @@
 # api/document_parser.py
+import hashlib
+import multiprocessing
 import os
+import shutil
 import sqlite3
 from datetime import datetime
-from typing import List, Dict, Optional, Union
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from typing import Callable, Iterator, List, Dict, Optional, Tuple, Union
 from PyPDF2 import PdfReader 
 from docx import Document
 from dotenv import load_dotenv 
+from api import db, tracing
+from api.chunker import PAGE_SEPARATOR
+from api.embedding_index import text_sha256
 
 # Load environment variables
 load_dotenv()
@@ -13,79 +20,98 @@ load_dotenv()
 # Database setup
 DB_PATH = os.getenv('DB_PATH', 'data/compliance.db')
 
+# Uploads are copied to disk in pieces of this size instead of being buffered whole
+COPY_BUFFER_SIZE = 1024 * 1024
+
 def init_db():
     """Initialize the database with required tables"""
-    try:
-        os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                company_name TEXT NOT NULL,
-                branch_location TEXT,
-                original_filename TEXT NOT NULL,
-                stored_path TEXT NOT NULL,
-                upload_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                processed_text TEXT,
-                file_size_kb INTEGER,
-                file_type TEXT
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS processing_results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                document_id INTEGER REFERENCES documents(id),
-                regulation_name TEXT NOT NULL,
-                clause_id TEXT NOT NULL,
-                similarity_score REAL NOT NULL,
-                processing_timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY(document_id) REFERENCES documents(id)
-            )
-        ''')
-        conn.commit()
-    except Exception as e:
-        raise Exception(f"Database initialization failed: {str(e)}")
-    finally:
-        conn.close()
+    db.init_db(DB_PATH)
 
-def extract_text_from_file(file_path: str) -> str:
-    """Extract text from PDF, DOCX, or TXT files"""
+def iter_pages_from_file(file_path: str) -> Iterator[Tuple[int, str]]:
+    """
+    Stream text per page (PDF) or paragraph (DOCX) from a control document
+    Each page is extracted exactly once and nothing is accumulated, so very
+    large files can be chunked and embedded without holding their full text.
+    A TXT file is one unit with its whitespace kept, so its processed_text and
+    text_hash do not change when it is uploaded again.
+    Yields:
+        (page/paragraph index, text) for non-empty units
+    """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"File not found: {file_path}")
     
     try:
         if file_path.endswith('.pdf'):
             reader = PdfReader(file_path)
-            text = " ".join([page.extract_text() for page in reader.pages if page.extract_text()])
+            for i, page in enumerate(reader.pages):
+                text = (page.extract_text() or "").strip()
+                if text:
+                    yield i, text
         elif file_path.endswith('.docx'):
             doc = Document(file_path)
-            text = " ".join([para.text for para in doc.paragraphs])
+            for i, para in enumerate(doc.paragraphs):
+                text = para.text.strip()
+                if text:
+                    yield i, text
         elif file_path.endswith('.txt'):
             with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
+                text = f.read().strip()
+            if text:
+                yield 0, text
         else:
             raise ValueError(f"Unsupported file format: {os.path.splitext(file_path)[1]}")
-        
-        return text.strip()
     except Exception as e:
         raise Exception(f"Error processing {file_path}: {str(e)}")
 
-def extract_text_from_files(company_name: Optional[str] = None) -> List[str]:
+def extract_pages_from_file(file_path: str) -> List[Tuple[int, str]]:
+    """
+    Extract text per page (PDF), paragraph (DOCX) or whole file (TXT) from a control document
+    Returns:
+        List of (page/paragraph index, text) for non-empty units
+    """
+    with tracing.span('text_extraction', items=1):
+        return list(iter_pages_from_file(file_path))
+
+def join_pages(pages: List[Tuple[int, str]]) -> Tuple[str, List[List[int]]]:
+    """
+    Join extracted units into one text, keeping where each unit starts
+    Returns:
+        (text, [[char_start, page/paragraph index], ...])
+    """
+    parts = []
+    page_offsets = []
+    position = 0
+    for index, text in pages:
+        page_offsets.append([position, index])
+        parts.append(text)
+        position += len(text) + len(PAGE_SEPARATOR)
+    return PAGE_SEPARATOR.join(parts), page_offsets
+
+def extract_text_from_file(file_path: str) -> str:
+    """Extract text from PDF, DOCX, or TXT files"""
+    text, _ = join_pages(extract_pages_from_file(file_path))
+    return text
+
+def extract_text_from_files(company_name: Optional[str] = None, branch: Optional[str] = None) -> List[str]:
     """
     Get all processed texts from database for matching
     Args:
         company_name: Optional filter by company
+        branch: Optional filter by branch (with company_name)
     Returns:
         List of non-empty document texts
     """
     try:
-        conn = sqlite3.connect(DB_PATH)
-        cursor = conn.cursor()
+        init_db()
+        cursor = db.get_connection(DB_PATH).cursor()
         
-        if company_name:
+        if company_name and branch:
+            cursor.execute(
+                'SELECT processed_text FROM documents '
+                'WHERE company_name = ? AND branch_location = ? AND processed_text IS NOT NULL',
+                (company_name, branch)
+            )
+        elif company_name:
             cursor.execute(
                 'SELECT processed_text FROM documents WHERE company_name = ? AND processed_text IS NOT NULL',
                 (company_name,)
@@ -97,8 +123,6 @@ def extract_text_from_files(company_name: Optional[str] = None) -> List[str]:
         return texts
     except Exception as e:
         raise Exception(f"Failed to fetch documents: {str(e)}")
-    finally:
-        conn.close()
 
 def save_document_metadata(
     company: str,
@@ -112,45 +136,120 @@ def save_document_metadata(
         file_size = os.path.getsize(filepath) / 1024  # Size in KB
         file_type = os.path.splitext(filename)[1].lower()
         
-        conn = sqlite3.connect(DB_PATH)
+        conn = db.get_connection(DB_PATH)
         cursor = conn.cursor()
         
-        cursor.execute('''
-            INSERT INTO documents (
-                company_name, 
-                branch_location, 
-                original_filename, 
-                stored_path, 
-                processed_text,
-                file_size_kb,
-                file_type
-            ) VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (company, branch, filename, filepath, text, file_size, file_type))
-        
-        doc_id = cursor.lastrowid
-        conn.commit()
+        with tracing.span('db_insert', items=1, batch_size=1):
+            cursor.execute('''
+                INSERT INTO documents (
+                    company_name,
+                    branch_location,
+                    original_filename,
+                    stored_path,
+                    processed_text,
+                    file_size_kb,
+                    file_type,
+                    text_hash
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (company, branch, filename, filepath, text, file_size, file_type, text_sha256(text)))
+
+            doc_id = cursor.lastrowid
+            conn.commit()
         return doc_id
     except Exception as e:
         conn.rollback()
         raise Exception(f"Failed to save document metadata: {str(e)}")
-    finally:
-        conn.close()
+
+def save_documents_metadata(records: List[Dict[str, str]]) -> List[int]:
+    """
+    Save many documents in a single transaction
+    Args:
+        records: Dicts with company, branch, filename, filepath and text
+    Returns:
+        Document ids in the same order as records
+    """
+    conn = db.get_connection(DB_PATH)
+    try:
+        with tracing.span('db_insert', items=len(records), batch_size=len(records)):
+            cursor = conn.cursor()
+            doc_ids = []
+
+            for record in records:
+                cursor.execute('''
+                    INSERT INTO documents (
+                        company_name, 
+                        branch_location, 
+                        original_filename, 
+                        stored_path, 
+                        processed_text,
+                        file_size_kb,
+                        file_type,
+                        text_hash
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    record['company'],
+                    record['branch'],
+                    record['filename'],
+                    record['filepath'],
+                    record['text'],
+                    os.path.getsize(record['filepath']) / 1024,
+                    os.path.splitext(record['filename'])[1].lower(),
+                    text_sha256(record['text'])
+                ))
+                doc_ids.append(cursor.lastrowid)
+        
+            conn.commit()
+        return doc_ids
+    except Exception as e:
+        conn.rollback()
+        raise Exception(f"Failed to save document metadata: {str(e)}")
+
+def hash_uploads(uploaded_files: List[object]) -> str:
+    """
+    Content hash of a set of uploads, independent of their order
+    Each file is hashed in COPY_BUFFER_SIZE pieces from getbuffer() (or read())
+    together with its name.
+    """
+    digests = []
+    for uploaded_file in uploaded_files:
+        digest = hashlib.sha256(getattr(uploaded_file, 'name', 'unknown').encode('utf-8'))
+        if hasattr(uploaded_file, 'getbuffer'):
+            buffer = memoryview(uploaded_file.getbuffer())
+            for start in range(0, len(buffer), COPY_BUFFER_SIZE):
+                digest.update(buffer[start:start + COPY_BUFFER_SIZE])
+        else:
+            if hasattr(uploaded_file, 'seek'):
+                uploaded_file.seek(0)
+            for piece in iter(lambda: uploaded_file.read(COPY_BUFFER_SIZE), b''):
+                digest.update(piece)
+            if hasattr(uploaded_file, 'seek'):
+                uploaded_file.seek(0)
+        digests.append(digest.hexdigest())
+    return hashlib.sha256('\n'.join(sorted(digests)).encode('utf-8')).hexdigest()
 
 def parse_controls(
     uploaded_files: List[object],
     company_info: Dict[str, str],
-    save_dir: str = "data/controls"
+    save_dir: str = "data/controls",
+    workers: int = 1,
+    batch_size: int = 50,
+    progress_callback: Optional[Callable[[int, int, str, Optional[Exception]], None]] = None
 ) -> List[Dict[str, Union[int, str]]]:
     """
     Process uploaded control documents with database support
     
     Args:
-        uploaded_files: List of file-like objects with .name and .getbuffer()
+        uploaded_files: List of file-like objects with .name and .read() or .getbuffer()
         company_info: Dictionary with 'name' and optional 'branch'
         save_dir: Directory to store uploaded files
+        workers: Extraction processes; 1 extracts in the calling process
+        batch_size: Documents inserted per database transaction
+        progress_callback: Called as (done, total, filename, error) once per file, after its
+            row is inserted; error is the extraction or insert error, or None
     
     Returns:
-        List of processed documents with ids, texts, and paths
+        List of processed documents with ids, texts, paths and page offsets,
+        in upload order
     """
     if not isinstance(company_info, dict):
         raise ValueError("company_info must be a dictionary")
@@ -160,41 +259,109 @@ def parse_controls(
     # Initialize database on first run
     init_db()
     os.makedirs(save_dir, exist_ok=True)
-    processed_documents = []
+    total = len(uploaded_files)
+    done = 0
     
-    for uploaded_file in uploaded_files:
+    def report(filename, error=None):
+        nonlocal done
+        done += 1
+        if error is not None:
+            print(f"Error processing {filename}: {str(error)}")
+        if progress_callback:
+            progress_callback(done, total, filename, error)
+    
+    # Save original files first; upload objects cannot be sent to worker processes
+    saved = []
+    for position, uploaded_file in enumerate(uploaded_files):
+        filename = getattr(uploaded_file, 'name', 'unknown')
         try:
             file_path = os.path.join(save_dir, uploaded_file.name)
-            
-            # Save original file
-            with open(file_path, "wb") as f:
-                f.write(uploaded_file.getbuffer())
-            
-            # Extract text
-            text = extract_text_from_file(file_path)
-            if not text:
-                continue
-                
-            # Save to database
-            doc_id = save_document_metadata(
-                company=company_info.get('name', 'Unknown'),
-                branch=company_info.get('branch', 'Headquarters'),
-                filename=uploaded_file.name,
-                filepath=file_path,
-                text=text
-            )
-            
-            processed_documents.append({
-                'id': doc_id,
-                'text': text,
-                'original_path': file_path
-            })
-            
+            with tracing.span('file_write', items=1), open(file_path, "wb") as f:
+                if hasattr(uploaded_file, 'read'):
+                    if hasattr(uploaded_file, 'seek'):
+                        uploaded_file.seek(0)
+                    shutil.copyfileobj(uploaded_file, f, COPY_BUFFER_SIZE)
+                else:
+                    f.write(uploaded_file.getbuffer())
+            saved.append((position, filename, file_path))
         except Exception as e:
-            print(f"Error processing {getattr(uploaded_file, 'name', 'unknown')}: {str(e)}")
-            continue
+            report(filename, e)
     
-    return processed_documents
+    processed = {}
+    pending = []
+    
+    def flush():
+        """Single writer: insert buffered documents in one transaction, then report each file"""
+        if not pending:
+            return
+        records = [{
+            'company': company_info.get('name', 'Unknown'),
+            'branch': company_info.get('branch', 'Headquarters'),
+            'filename': filename,
+            'filepath': document['original_path'],
+            'text': document['text']
+        } for _, filename, document in pending]
+        errors = [None] * len(records)
+        try:
+            doc_ids = save_documents_metadata(records)
+        except Exception:
+            # Fall back to one transaction per file so one bad row does not drop the batch
+            doc_ids = []
+            for i, record in enumerate(records):
+                try:
+                    doc_ids.append(save_document_metadata(**record))
+                except Exception as e:
+                    errors[i] = e
+                    doc_ids.append(None)
+        for (position, filename, document), doc_id, error in zip(pending, doc_ids, errors):
+            if doc_id is not None:
+                document['id'] = doc_id
+                processed[position] = document
+            report(filename, error)
+        pending.clear()
+    
+    # Extract text in worker processes, remembering where each page/paragraph starts.
+    # Spawned workers: forking a process that runs Streamlit or torch threads can deadlock
+    if workers > 1:
+        executor = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    else:
+        executor = ThreadPoolExecutor(max_workers=1)
+    with executor:
+        futures = {
+            executor.submit(extract_pages_from_file, file_path): submitted
+            for submitted, (_, _, file_path) in enumerate(saved)
+        }
+        # Extractions finish in any order; rows are inserted in upload order so ids follow it
+        extracted = {}
+        next_insert = 0
+        for future in as_completed(futures):
+            try:
+                extracted[futures[future]] = join_pages(future.result())
+            except Exception as e:
+                extracted[futures[future]] = e
+            while next_insert in extracted:
+                position, filename, file_path = saved[next_insert]
+                outcome = extracted.pop(next_insert)
+                next_insert += 1
+                if isinstance(outcome, Exception):
+                    report(filename, outcome)
+                    continue
+                text, page_offsets = outcome
+                if not text:
+                    report(filename)
+                    continue
+                # Reported by flush() once its insert succeeded or failed
+                pending.append((position, filename, {
+                    'id': None,
+                    'text': text,
+                    'original_path': file_path,
+                    'page_offsets': page_offsets
+                }))
+                if len(pending) >= batch_size:
+                    flush()
+    flush()
+    
+    return [processed[position] for position in sorted(processed)]
 
 def get_company_documents(
     company_name: str,
@@ -202,9 +369,9 @@ def get_company_documents(
 ) -> List[Dict[str, Union[int, str, datetime]]]:
     """Retrieve all documents for a specific company/branch"""
     try:
-        conn = sqlite3.connect(DB_PATH)
-        conn.row_factory = sqlite3.Row  # Return dict-like rows
-        cursor = conn.cursor()
+        init_db()
+        cursor = db.get_connection(DB_PATH).cursor()
+        cursor.row_factory = sqlite3.Row  # Return dict-like rows
         
         if branch:
             cursor.execute('''
@@ -221,6 +388,4 @@ def get_company_documents(
         
         return [dict(row) for row in cursor.fetchall()]
     except Exception as e:
-        raise Exception(f"Failed to fetch company documents: {str(e)}")
-    finally:
-        conn.close()
\ No newline at end of file
+        raise Exception(f"Failed to fetch company documents: {str(e)}")
\ No newline at end of file
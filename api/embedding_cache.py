@@ -0,0 +1,170 @@
+# api/embedding_cache.py
+import os
+import sqlite3
+import time
+from typing import Dict, Optional, Sequence
+import numpy as np
+from dotenv import load_dotenv
+from api import db
+from api.quantization import EMBEDDING_STORAGE, STORAGE_DTYPES, dequantize_rows, quantize_rows
+
+# Load environment variables
+load_dotenv()
+
+DB_PATH = os.getenv('DB_PATH', 'data/compliance.db')
+CACHE_PATH = os.getenv(
+    'EMBEDDING_CACHE_PATH',
+    os.path.join(os.path.dirname(DB_PATH) or '.', 'embedding_cache.db')
+)
+CACHE_MAX_MB = float(os.getenv('EMBEDDING_CACHE_MAX_MB', '1024'))
+
+# SQLite limits the number of bound parameters per statement
+_LOOKUP_BATCH = 500
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache keyed by (model name, text hash)
+
+    Vectors are stored as float32, float16 or scaled int8 BLOBs (storage) in a
+    SQLite file next to the compliance database; rows written with another
+    storage setting are still read back correctly. Every hit refreshes
+    last_access, and once the cache grows past max_mb the least recently
+    used rows are evicted.
+    """
+
+    def __init__(self, path: str = CACHE_PATH, max_mb: float = CACHE_MAX_MB, storage: str = EMBEDDING_STORAGE):
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown embedding storage: {storage}")
+        self.path = path
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.storage = storage
+        self._init_db()
+
+    def _connect(self) -> sqlite3.Connection:
+        return db.get_connection(self.path)
+
+    def _init_db(self) -> None:
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                dim INTEGER NOT NULL,
+                vector BLOB NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        ''')
+        # Caches created before compressed storage existed hold float32 rows
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(embeddings)").fetchall()]
+        if 'dtype' not in columns:
+            conn.execute("ALTER TABLE embeddings ADD COLUMN dtype TEXT NOT NULL DEFAULT 'float32'")
+            conn.execute("ALTER TABLE embeddings ADD COLUMN scale REAL")
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings(last_access)')
+        # Running total of size_bytes, kept by triggers so eviction checks never scan the table.
+        # The triggers exist before the total is seeded: rows written in between are in the sum.
+        conn.execute('CREATE TABLE IF NOT EXISTS cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS embeddings_size_insert AFTER INSERT ON embeddings BEGIN
+                UPDATE cache_stats SET value = value + NEW.size_bytes WHERE name = 'size_bytes';
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS embeddings_size_delete AFTER DELETE ON embeddings BEGIN
+                UPDATE cache_stats SET value = value - OLD.size_bytes WHERE name = 'size_bytes';
+            END
+        ''')
+        conn.execute('''
+            CREATE TRIGGER IF NOT EXISTS embeddings_size_update AFTER UPDATE OF size_bytes ON embeddings BEGIN
+                UPDATE cache_stats SET value = value + NEW.size_bytes - OLD.size_bytes WHERE name = 'size_bytes';
+            END
+        ''')
+        if conn.execute("SELECT 1 FROM cache_stats WHERE name = 'size_bytes'").fetchone() is None:
+            conn.execute(
+                "INSERT OR IGNORE INTO cache_stats (name, value) "
+                "SELECT 'size_bytes', COALESCE(SUM(size_bytes), 0) FROM embeddings"
+            )
+        conn.commit()
+
+    def get_many(self, model: str, text_hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for the hashes that are present, refreshing their LRU position"""
+        found = {}
+        unique = list(dict.fromkeys(text_hashes))
+        conn = self._connect()
+        for i in range(0, len(unique), _LOOKUP_BATCH):
+            batch = unique[i:i + _LOOKUP_BATCH]
+            placeholders = ','.join('?' * len(batch))
+            rows = conn.execute(
+                f'SELECT text_hash, dim, vector, dtype, scale FROM embeddings '
+                f'WHERE model = ? AND text_hash IN ({placeholders})',
+                [model] + batch
+            ).fetchall()
+            for text_hash, dim, vector, dtype, scale in rows:
+                data = np.frombuffer(vector, dtype=np.dtype(dtype), count=dim)
+                found[text_hash] = dequantize_rows(data, None if scale is None else np.float32(scale))
+        if found:
+            now = time.time()
+            conn.executemany(
+                'UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?',
+                [(now, model, h) for h in found]
+            )
+            conn.commit()
+        return found
+
+    def put_many(self, model: str, text_hashes: Sequence[str], vectors: np.ndarray) -> np.ndarray:
+        """
+        Store vectors (one row per hash) and evict old entries past the size limit
+        Returns:
+            The vectors as get_many will return them (dequantized for compressed storage),
+            so callers score a miss exactly like a later hit
+        """
+        data, scales = quantize_rows(vectors, self.storage)
+        stored = dequantize_rows(data, scales)
+        if scales is None:
+            scales = [None] * len(data)
+        now = time.time()
+        rows = [
+            (model, h, vec.shape[0], vec.tobytes(), vec.nbytes, now, self.storage,
+             None if scale is None else float(scale))
+            for h, vec, scale in zip(text_hashes, data, scales)
+        ]
+        conn = self._connect()
+        # An upsert rather than INSERT OR REPLACE: REPLACE's implicit delete skips the size triggers
+        conn.executemany('''
+            INSERT INTO embeddings (model, text_hash, dim, vector, size_bytes, last_access, dtype, scale)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (model, text_hash) DO UPDATE SET
+                dim = excluded.dim, vector = excluded.vector, size_bytes = excluded.size_bytes,
+                last_access = excluded.last_access, dtype = excluded.dtype, scale = excluded.scale
+        ''', rows)
+        conn.commit()
+        self._evict(conn)
+        return stored
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Delete least recently used rows until the cache fits in max_bytes"""
+        total = conn.execute("SELECT value FROM cache_stats WHERE name = 'size_bytes'").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        excess = total - self.max_bytes
+        freed = 0
+        stale = []
+        for rowid, size in conn.execute('SELECT rowid, size_bytes FROM embeddings ORDER BY last_access'):
+            stale.append((rowid,))
+            freed += size
+            if freed >= excess:
+                break
+        conn.executemany('DELETE FROM embeddings WHERE rowid = ?', stale)
+        conn.commit()
+
+    def clear(self, model: Optional[str] = None) -> None:
+        """Drop cached vectors, for one model or all of them"""
+        conn = self._connect()
+        if model:
+            conn.execute('DELETE FROM embeddings WHERE model = ?', (model,))
+        else:
+            conn.execute('DELETE FROM embeddings')
+        conn.commit()
@@ -0,0 +1,204 @@
+# api/embedding_index.py
+import hashlib
+import json
+import os
+import re
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+from api import tracing
+from api.quantization import EMBEDDING_STORAGE, STORAGE_DTYPES, load_compressed, write_compressed
+
+# Load environment variables
+load_dotenv()
+
+INDEX_DIR = os.getenv('EMBEDDING_INDEX_DIR', 'data/embeddings')
+
+
+def text_sha256(text: str) -> str:
+    """Stable content hash for a piece of text"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def regulations_fingerprint(regulations: Dict[str, Any]) -> str:
+    """Content hash of a regulations dict, independent of key order and formatting"""
+    payload = json.dumps(regulations, sort_keys=True, ensure_ascii=False)
+    return text_sha256(payload)
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    """L2-normalize embedding rows so a dot product equals cosine similarity"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class ClauseEmbeddingIndex:
+    """
+    Regulation clause embeddings persisted on disk and shared across runs
+
+    The matrix is stored as a .npy file (loaded with mmap_mode='r') next to a
+    JSON metadata file recording the model name, the regulations fingerprint
+    and a hash per clause text. Rebuilding only encodes clauses whose text
+    is not already present in the previous matrix, and a scoped build only
+    encodes the clauses of the regulations in scope.
+
+    With storage 'float16' or 'int8' a compressed copy (clauses.<storage>.npy)
+    is derived from the float32 matrix and memory-mapped as embeddings for
+    scoring; the float32 rows stay available as exact for re-ranking, so only
+    the shortlisted rows of the larger file are ever paged in.
+    """
+
+    def __init__(self, model, model_name: str, index_dir: str = INDEX_DIR, storage: str = EMBEDDING_STORAGE):
+        if storage not in STORAGE_DTYPES:
+            raise ValueError(f"Unknown embedding storage: {storage}")
+        self.model = model
+        self.model_name = model_name
+        self.storage = storage
+        self.index_dir = os.path.join(index_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        self.matrix_path = os.path.join(self.index_dir, 'clauses.npy')
+        self.metadata_path = os.path.join(self.index_dir, 'clauses.json')
+        self.compressed_path = os.path.join(self.index_dir, f'clauses.{storage}.npy')
+        self.scales_path = os.path.join(self.index_dir, f'clauses.{storage}.scales.npy')
+        # Records which revision of clauses.npy the compressed copy was derived from
+        self.compressed_stamp_path = os.path.join(self.index_dir, f'clauses.{storage}.json')
+
+        self.fingerprint: Optional[str] = None
+        # Matrix used for scoring (compressed unless storage is float32) and the float32 rows
+        self.embeddings: Optional[np.ndarray] = None
+        self.exact: Optional[np.ndarray] = None
+        self.compressed = storage != 'float32'
+        # Which rows hold an embedding; scoped builds leave other rows at zero
+        self.encoded: np.ndarray = np.zeros(0, dtype=bool)
+        # Compiled regulations the rows belong to (see api.regulation_store)
+        self.store = None
+        self.texts: List[str] = []
+        # Clauses of one regulation are contiguous rows: name -> (start, end)
+        self.regulation_slices: Dict[str, Tuple[int, int]] = {}
+
+    def _read_metadata(self) -> Optional[Dict[str, Any]]:
+        if not (os.path.exists(self.metadata_path) and os.path.exists(self.matrix_path)):
+            return None
+        try:
+            with open(self.metadata_path, 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('model') != self.model_name:
+            return None
+        return meta
+
+    def _load_matrix(self, meta: Dict[str, Any]) -> np.ndarray:
+        # Empty arrays cannot be memory-mapped
+        if not meta.get('dim') or not meta.get('text_hashes'):
+            return np.zeros((len(meta.get('text_hashes', [])), meta.get('dim', 0)), dtype=np.float32)
+        return np.load(self.matrix_path, mmap_mode='r')
+
+    def _attach(self, meta: Dict[str, Any]) -> None:
+        """Map the float32 matrix and, for compressed storage, its (re)derived compressed copy"""
+        self.exact = self._load_matrix(meta)
+        if not self.compressed:
+            self.embeddings = self.exact
+            return
+
+        revision = meta.get('revision') or meta.get('fingerprint')
+        stamp = None
+        if os.path.exists(self.compressed_stamp_path) and os.path.exists(self.compressed_path):
+            try:
+                with open(self.compressed_stamp_path, 'r') as f:
+                    stamp = json.load(f).get('revision')
+            except (OSError, ValueError):
+                stamp = None
+        if stamp != revision:
+            write_compressed(self.exact, self.storage, self.compressed_path, self.scales_path)
+            suffix = f".{os.getpid()}.{uuid.uuid4().hex}.tmp"
+            with open(self.compressed_stamp_path + suffix, 'w') as f:
+                json.dump({'revision': revision}, f)
+            os.replace(self.compressed_stamp_path + suffix, self.compressed_stamp_path)
+        self.embeddings = load_compressed(self.storage, self.compressed_path, self.scales_path)
+
+    def _write(self, matrix: np.ndarray, meta: Dict[str, Any]) -> None:
+        """Write matrix and metadata atomically so concurrent readers never see a partial index"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        # Unique per call: threads of one process build indexes concurrently
+        suffix = f".{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        with open(self.matrix_path + suffix, 'wb') as f:
+            np.save(f, matrix)
+        with open(self.metadata_path + suffix, 'w') as f:
+            json.dump(meta, f)
+        os.replace(self.matrix_path + suffix, self.matrix_path)
+        os.replace(self.metadata_path + suffix, self.metadata_path)
+
+    def build(self, regulations: Any, scope: Optional[List[str]] = None) -> 'ClauseEmbeddingIndex':
+        """
+        Load or (incrementally) rebuild the index for the given regulations
+        Args:
+            regulations: RegulationStore, or a regulations dict (compiled with as_store)
+            scope: Regulation names that must be encoded; other clauses are only
+                   encoded when a later call needs them (None encodes everything)
+        Returns:
+            self, with embeddings aligned row by row with store and texts;
+            rows outside every scope requested so far are zero (see encoded)
+        """
+        # Deferred: regulation_store imports this module
+        from api.regulation_store import as_store
+        store = as_store(regulations)
+        fingerprint = store.fingerprint
+        needed = store.rows(scope) if scope is not None else np.arange(len(store))
+        if fingerprint == self.fingerprint and self.embeddings is not None and self.encoded[needed].all():
+            return self
+
+        texts = store.texts
+        hashes = store.text_hashes
+        meta = self._read_metadata()
+        stored_hashes = meta.get('text_hashes', []) if meta else []
+
+        if meta and meta.get('fingerprint') == fingerprint and all(stored_hashes[row] for row in needed):
+            self._attach(meta)
+            encoded = [bool(h) for h in stored_hashes]
+        else:
+            # Reuse rows for clause texts that were already embedded; unencoded rows have no hash
+            previous_rows = {}
+            previous = None
+            if meta:
+                previous = self._load_matrix(meta)
+                previous_rows = {h: i for i, h in enumerate(stored_hashes) if h}
+
+            missing = [int(row) for row in needed if hashes[row] not in previous_rows]
+            new_embeddings = None
+            if missing:
+                with tracing.span('clause_encoding', items=len(missing)):
+                    new_embeddings = normalize_rows(self.model.encode([texts[i] for i in missing]))
+
+            dim = new_embeddings.shape[1] if new_embeddings is not None else (
+                previous.shape[1] if previous is not None else 0)
+            matrix = np.zeros((len(texts), dim), dtype=np.float32)
+            encoded = [False] * len(texts)
+            if new_embeddings is not None:
+                matrix[missing] = new_embeddings
+                for row in missing:
+                    encoded[row] = True
+            for i, h in enumerate(hashes):
+                if h in previous_rows:
+                    matrix[i] = previous[previous_rows[h]]
+                    encoded[i] = True
+
+            meta = {
+                'model': self.model_name,
+                'fingerprint': fingerprint,
+                'revision': uuid.uuid4().hex,
+                'dim': dim,
+                'text_hashes': [h if done else None for h, done in zip(hashes, encoded)],
+                'clauses': [list(store.clause_metadata(row)) for row in range(len(store))]
+            }
+            self._write(matrix, meta)
+            self._attach(meta)
+
+        self.fingerprint = fingerprint
+        self.encoded = np.array(encoded, dtype=bool)
+        self.store = store
+        self.texts = texts
+        self.regulation_slices = store.regulation_slices
+        return self
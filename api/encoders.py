@@ -0,0 +1,165 @@
+# api/encoders.py
+"""
+CPU encoder backends with the SentenceTransformer encode() interface
+
+    torch       full-precision SentenceTransformer (default)
+    torch-int8  the same model with its Linear layers dynamically quantized to int8
+    onnx        the transformer exported to ONNX and run with onnxruntime
+    onnx-int8   the ONNX export with int8 dynamically quantized weights
+
+ONNX exports are written once to ONNX_DIR/<model> and reused. The quantized
+backends produce slightly different vectors, so MatchEngine keeps their
+persisted clause index and cached document vectors apart from fp32 ones (see
+encoder_key). Compare rankings with `python -m benchmarks.encoder_accuracy`.
+"""
+import os
+import re
+from typing import List, Optional
+import numpy as np
+from dotenv import load_dotenv
+from api.model_registry import resolve_model_path
+
+# Load environment variables
+load_dotenv()
+
+ENCODER_BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+ONNX_DIR = os.getenv('ONNX_DIR', 'data/onnx')
+# MiniLM sentence-transformers models truncate at 256 word pieces
+MAX_SEQ_LENGTH = 256
+
+
+def encoder_key(model_name: str, backend: str = 'torch') -> str:
+    """Namespace for vectors produced by a model/backend pair (fp32 keeps the bare model name)"""
+    return model_name if backend == 'torch' else f"{model_name}@{backend}"
+
+
+def _mean_pool(token_embeddings: np.ndarray, attention_mask: np.ndarray) -> np.ndarray:
+    mask = attention_mask[..., None].astype(np.float32)
+    summed = (token_embeddings * mask).sum(axis=1)
+    return summed / np.clip(mask.sum(axis=1), 1e-9, None)
+
+
+class TorchInt8Encoder:
+    """SentenceTransformer with torch dynamic int8 quantization of its Linear layers"""
+
+    def __init__(self, model_name: str, threads: Optional[int] = None):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        if threads:
+            # Process-wide setting in torch
+            torch.set_num_threads(threads)
+        model = SentenceTransformer(
+            resolve_model_path(model_name),
+            device='cpu',
+            use_auth_token=os.getenv('HUGGINGFACEHUB_API_TOKEN')
+        )
+        self.model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
+
+
+class OnnxEncoder:
+    """
+    Transformer exported to ONNX, run with onnxruntime, mean-pooled like the sentence-transformers model
+    Args:
+        model_name: Hub name or name under MODEL_DIR
+        quantize: Use int8 dynamically quantized weights
+        threads: onnxruntime intra-op threads (None lets onnxruntime decide)
+    """
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: Optional[int] = None,
+                 onnx_dir: str = ONNX_DIR):
+        import onnxruntime
+        from transformers import AutoTokenizer
+
+        self.model_dir = os.path.join(onnx_dir, re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name))
+        fp32_path = os.path.join(self.model_dir, 'model.onnx')
+        if not os.path.exists(fp32_path):
+            export_onnx(model_name, self.model_dir)
+        model_path = fp32_path
+        if quantize:
+            model_path = os.path.join(self.model_dir, 'model.int8.onnx')
+            if not os.path.exists(model_path):
+                quantize_onnx(fp32_path, model_path)
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+            options.inter_op_num_threads = 1
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(self.model_dir)
+
+    def encode(self, texts: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        embeddings = []
+        # Sorting by length keeps padding per batch small; order is restored below
+        order = np.argsort([-len(text) for text in texts], kind='stable')
+        for start in range(0, len(texts), batch_size):
+            batch = [texts[i] for i in order[start:start + batch_size]]
+            inputs = self.tokenizer(batch, padding=True, truncation=True,
+                                    max_length=MAX_SEQ_LENGTH, return_tensors='np')
+            feeds = {name: value.astype(np.int64) for name, value in inputs.items() if name in self.input_names}
+            token_embeddings = self.session.run(None, feeds)[0]
+            embeddings.append(_mean_pool(token_embeddings, inputs['attention_mask']))
+        if not embeddings:
+            return np.zeros((0, 0), dtype=np.float32)
+        result = np.empty((len(texts), embeddings[0].shape[1]), dtype=np.float32)
+        result[order] = np.vstack(embeddings)
+        return result
+
+
+def export_onnx(model_name: str, output_dir: str) -> str:
+    """Export the model's transformer to output_dir/model.onnx with its tokenizer"""
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+
+    path = resolve_model_path(model_name)
+    token = os.getenv('HUGGINGFACEHUB_API_TOKEN')
+    tokenizer = AutoTokenizer.from_pretrained(path, use_auth_token=token)
+    model = AutoModel.from_pretrained(path, use_auth_token=token).eval()
+
+    os.makedirs(output_dir, exist_ok=True)
+    sample = tokenizer(["Export sample sentence"], return_tensors='pt')
+    input_names = [name for name in ('input_ids', 'attention_mask', 'token_type_ids') if name in sample]
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+
+    output_path = os.path.join(output_dir, 'model.onnx')
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            tmp_path,
+            input_names=input_names,
+            output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            do_constant_folding=True
+        )
+    tokenizer.save_pretrained(output_dir)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def quantize_onnx(input_path: str, output_path: str) -> str:
+    """Write an int8 dynamically quantized copy of an ONNX model"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    quantize_dynamic(input_path, tmp_path, weight_type=QuantType.QInt8)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+
+def create_encoder(model_name: str, backend: str = 'torch', threads: Optional[int] = None):
+    """Build an encoder for a backend in ENCODER_BACKENDS (use model_registry.get_encoder to share it)"""
+    if backend == 'torch-int8':
+        return TorchInt8Encoder(model_name, threads=threads)
+    if backend in ('onnx', 'onnx-int8'):
+        try:
+            return OnnxEncoder(model_name, quantize=backend == 'onnx-int8', threads=threads)
+        except ImportError:
+            raise ImportError("The ONNX encoder backends require onnxruntime: pip install onnxruntime")
+    raise ValueError(f"Unknown encoder backend: {backend}")
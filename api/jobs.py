@@ -0,0 +1,131 @@
+# api/jobs.py
+"""
+Process-wide registry of analysis jobs with progress
+
+Jobs are keyed by what they compute (e.g. a hash of the uploaded files and
+the settings), so a second session submitting the same work attaches to
+the running job or reuses its finished result instead of starting again.
+Finished jobs are kept in a bounded LRU; submitting a key whose job failed
+starts it again.
+"""
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+JOB_HISTORY = int(os.getenv('JOB_HISTORY', '32'))
+
+
+class Job:
+    """
+    Progress and outcome of one unit of work
+    status is 'pending', 'running', 'done' or 'failed'; progress() may be
+    called from the worker with (done, total, stage).
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.status = 'pending'
+        self.done = 0
+        self.total = 0
+        self.stage = ''
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._event = threading.Event()
+
+    def progress(self, done: int, total: int, stage: str = '') -> None:
+        self.done, self.total = done, total
+        if stage:
+            self.stage = stage
+
+    @property
+    def fraction(self) -> float:
+        return min(1.0, self.done / self.total) if self.total else 0.0
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Block until the job has finished; False on timeout"""
+        return self._event.wait(timeout)
+
+    def _run(self, fn: Callable[['Job'], Any]) -> None:
+        self.status = 'running'
+        self.started = time.time()
+        try:
+            self.result = fn(self)
+            self.status = 'done'
+        except Exception as e:
+            self.error = f"{str(e)}\n{traceback.format_exc()}"
+            self.status = 'failed'
+        finally:
+            self.finished = time.time()
+            self._event.set()
+
+
+class JobRegistry:
+    """Runs jobs inline or on a small thread pool and remembers recent ones by key"""
+
+    def __init__(self, workers: int = JOB_WORKERS, history: int = JOB_HISTORY):
+        self.history = history
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='analysis-job')
+
+    def get(self, key: str) -> Optional[Job]:
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+            return job
+
+    def submit(self, key: str, fn: Callable[[Job], Any], background: bool = True) -> Job:
+        """
+        Start fn(job) for key unless a pending, running or finished job already exists
+        With background=False the job runs in the calling thread before returning.
+        """
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is not None and job.status != 'failed':
+                self._jobs.move_to_end(key)
+                return job
+            job = Job(key)
+            self._jobs[key] = job
+            self._prune()
+
+        if background:
+            self._executor.submit(job._run, fn)
+        else:
+            job._run(fn)
+        return job
+
+    def discard(self, key: str) -> None:
+        with self._lock:
+            self._jobs.pop(key, None)
+
+    def _prune(self) -> None:
+        # Only finished jobs are evicted; running ones are still being polled
+        excess = len(self._jobs) - self.history
+        for key in [k for k, j in self._jobs.items() if j.status in ('done', 'failed')][:max(0, excess)]:
+            del self._jobs[key]
+
+
+_registry: Optional[JobRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> JobRegistry:
+    """Process-wide job registry shared by every dashboard session"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = JobRegistry()
+    return _registry
@@ -0,0 +1,169 @@
+# api/lexical.py
+"""
+Lexical pre-filter for clause matching: BM25 over clause texts plus citations
+
+A control that says "encrypted per GDPR Article 6" names its clause outright,
+and one that shares rare words with a clause is a likely match. LexicalIndex
+scores every clause with BM25 from an inverted index (postings hold the
+precomputed BM25 weight, so a query is a few scatter-adds) and detects
+citations of the form "<REG> Article|Section|Clause N", "Article N of <REG>"
+or "<REG>_N". MatchEngine uses the union of the top BM25 clauses and the
+cited ones as the candidate set that the dense stage scores, and ranks them
+by reciprocal-rank fusion of the dense and lexical rankings; clauses a
+document cites explicitly rank above every clause it does not cite.
+"""
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Optional
+import numpy as np
+from dotenv import load_dotenv
+from api.regulation_store import RegulationStore
+
+# Load environment variables
+load_dotenv()
+
+# Only libraries with at least this many clauses in scope are pre-filtered (0 disables it)
+HYBRID_MIN_CLAUSES = int(os.getenv('HYBRID_MIN_CLAUSES', '5000'))
+# BM25 candidates per document handed to the dense stage (cited clauses are added)
+HYBRID_CANDIDATES = int(os.getenv('HYBRID_CANDIDATES', '200'))
+RRF_K = 60
+
+_TOKEN_PATTERN = re.compile(r'[a-z0-9]+')
+_STOPWORDS = frozenset(
+    'a an and are as at be by for from has have in is it its must not of on or per that the their '
+    'this to was were will with we our all any can may only should'.split()
+)
+_SUFFIXES = ('ing', 'ed', 'es', 's', 'ly')
+_REFERENCE = r'(?:article|art\.?|section|sec\.?|§|clause|rule|principle|paragraph|para\.?)'
+
+
+def tokenize(text: str):
+    """Lower-cased word tokens without stopwords, with common suffixes stripped"""
+    tokens = []
+    for token in _TOKEN_PATTERN.findall(text.lower()):
+        if token in _STOPWORDS:
+            continue
+        for suffix in _SUFFIXES:
+            if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+                token = token[:-len(suffix)]
+                break
+        tokens.append(token)
+    return tokens
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index and citation detector over a RegulationStore's clauses
+    Postings are stored term-major in flat arrays (postings_rows, postings_weights)
+    with per-term offsets.
+    """
+
+    def __init__(self, store: RegulationStore, k1: float = 1.2, b: float = 0.75):
+        self.store = store
+        n_clauses = len(store)
+        vocabulary = {}
+        term_ids, rows, counts = [], [], []
+        lengths = np.zeros(n_clauses, dtype=np.float32)
+        for row, text in enumerate(store.texts):
+            tokens = tokenize(text)
+            lengths[row] = len(tokens)
+            for token, count in Counter(tokens).items():
+                term_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                rows.append(row)
+                counts.append(count)
+        self.vocabulary = vocabulary
+
+        term_ids = np.array(term_ids, dtype=np.int64)
+        rows = np.array(rows, dtype=np.int64)
+        tf = np.array(counts, dtype=np.float32)
+        order = np.argsort(term_ids, kind='stable')
+        df = np.bincount(term_ids, minlength=len(vocabulary)).astype(np.float32)
+        idf = np.log1p((n_clauses - df + 0.5) / (df + 0.5))
+        avg_length = float(lengths.mean()) if n_clauses and lengths.mean() > 0 else 1.0
+        norm = k1 * (1 - b + b * lengths[rows] / avg_length)
+        weights = idf[term_ids] * tf * (k1 + 1) / (tf + norm)
+
+        self.postings_rows = rows[order]
+        self.postings_weights = weights[order].astype(np.float32)
+        self.offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        # Citations name a regulation and a clause number; clause ids are <REG>_<N>
+        self._names = {name.casefold(): name for name in store.regulation_names}
+        names = '|'.join(re.escape(name) for name in sorted(store.regulation_names, key=len, reverse=True))
+        self._forward = re.compile(
+            rf'(?<![A-Za-z0-9])({names})(?:\s*[_-]\s*|\s+{_REFERENCE}?\s*|\s*{_REFERENCE}\s*)(\d+)\b',
+            re.IGNORECASE
+        ) if names else None
+        self._backward = re.compile(
+            rf'\b{_REFERENCE}\s*(\d+)\s*(?:of\s+)?(?:the\s+)?({names})(?![A-Za-z0-9])',
+            re.IGNORECASE
+        ) if names else None
+
+    def scores(self, text: str) -> np.ndarray:
+        """BM25 score of every clause for a query text"""
+        scores = np.zeros(len(self.store), dtype=np.float32)
+        for token in set(tokenize(text)):
+            term = self.vocabulary.get(token)
+            if term is None:
+                continue
+            start, end = self.offsets[term], self.offsets[term + 1]
+            # Each clause appears once per term, so a fancy-indexed add is safe
+            scores[self.postings_rows[start:end]] += self.postings_weights[start:end]
+        return scores
+
+    def citations(self, text: str) -> np.ndarray:
+        """Rows of the clauses a text cites explicitly"""
+        if self._forward is None:
+            return np.empty(0, dtype=np.int64)
+        cited = set()
+        found = [(name, number) for name, number in self._forward.findall(text)]
+        found += [(name, number) for number, name in self._backward.findall(text)]
+        for name, number in found:
+            row = self.store.row(f"{self._names[name.casefold()]}_{int(number)}")
+            if row is not None:
+                cited.add(row)
+        return np.array(sorted(cited), dtype=np.int64)
+
+    def shortlist(self, scores: np.ndarray, cited: np.ndarray, k: int,
+                  mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Sorted rows of the k best-scoring clauses with any lexical overlap, plus cited ones (within mask)"""
+        if mask is not None:
+            scores = np.where(mask, scores, 0.0)
+            cited = cited[mask[cited]]
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        return np.union1d(matched, cited).astype(np.int64)
+
+
+def fuse(dense: np.ndarray, lexical: np.ndarray, cited: np.ndarray, rrf_k: int = RRF_K) -> np.ndarray:
+    """
+    Reciprocal-rank fusion of dense and lexical scores over the same candidates
+    Clauses without lexical overlap get no lexical term. Cited clauses get a
+    bonus of two first ranks, more than any uncited clause can reach, so they
+    come first (ordered among themselves by the fused rankings).
+    """
+    fused = np.zeros(len(dense), dtype=np.float32)
+    for scores, present in ((dense, np.ones(len(dense), dtype=bool)), (lexical, lexical > 0)):
+        ranks = np.empty(len(scores), dtype=np.float32)
+        ranks[np.argsort(-scores, kind='stable')] = np.arange(1, len(scores) + 1)
+        fused += np.where(present, 1.0 / (rrf_k + ranks), 0.0)
+    return fused + np.where(cited, 2.0 / (rrf_k + 1), 0.0)
+
+
+_indexes: "OrderedDict[str, LexicalIndex]" = OrderedDict()
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(store: RegulationStore, keep: int = 4) -> LexicalIndex:
+    """LexicalIndex for a store, built once per regulation library fingerprint"""
+    with _indexes_lock:
+        index = _indexes.get(store.fingerprint)
+        if index is None:
+            index = _indexes[store.fingerprint] = LexicalIndex(store)
+            while len(_indexes) > keep:
+                _indexes.popitem(last=False)
+        _indexes.move_to_end(store.fingerprint)
+        return index
@@ -1,24 +1,313 @@
 # api/match_engine.py
-from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
+from itertools import islice
 from dotenv import load_dotenv
 import os
-import sqlite3
-from document_parser import DocumentParser
-from regulation_loader import RegulationLoader
+import time
+from api import db, document_parser, tracing
+from api.regulation_loader import RegulationLoader, branch_scope
+from api.embedding_index import ClauseEmbeddingIndex, normalize_rows, text_sha256
+from api.regulation_store import as_store
+from api.embedding_cache import EmbeddingCache
+from api.match_table import MatchTable
+from api.quantization import EMBEDDING_RERANK, EMBEDDING_STORAGE, take_rows
+from api.lexical import HYBRID_CANDIDATES, HYBRID_MIN_CLAUSES, fuse, get_lexical_index
+from api.model_registry import (
+    CASCADE_CANDIDATES, CASCADE_ENCODER, MATCH_ENCODER, get_encoder, resolve_encoder
+)
+from api.encoders import encoder_key
+from api.chunker import chunk_text, iter_chunks, DEFAULT_MAX_WORDS, DEFAULT_OVERLAP
 
 load_dotenv()
 
+
+def top_k_scores(queries, matrix, k, query_block=256, clause_block=8192):
+    """
+    Top-k dot-product scores for every query row against every matrix row
+
+    The score matrix is computed in (query_block x clause_block) tiles and a
+    running top-k is merged per tile, so peak memory stays bounded no matter
+    how many controls or clauses there are.
+    Returns:
+        (scores, indices), both shaped (n_queries, k) and sorted best-first
+    """
+    n_queries, n_clauses = queries.shape[0], matrix.shape[0]
+    k = min(k, n_clauses)
+    scores = np.empty((n_queries, k), dtype=np.float32)
+    indices = np.empty((n_queries, k), dtype=np.int64)
+    if k == 0:
+        return scores, indices
+
+    # Tile products are timed as similarity, the rest as top-k selection (only when tracing)
+    timed = tracing.enabled()
+    started = time.perf_counter() if timed else 0.0
+    similarity_seconds = 0.0
+
+    for q_start in range(0, n_queries, query_block):
+        block = queries[q_start:q_start + query_block]
+        best_scores = np.full((block.shape[0], 0), -np.inf, dtype=np.float32)
+        best_indices = np.empty((block.shape[0], 0), dtype=np.int64)
+
+        for c_start in range(0, n_clauses, clause_block):
+            if timed:
+                tile_started = time.perf_counter()
+            tile = block @ np.asarray(matrix[c_start:c_start + clause_block], dtype=np.float32).T
+            if timed:
+                similarity_seconds += time.perf_counter() - tile_started
+            tile_indices = np.broadcast_to(
+                np.arange(c_start, c_start + tile.shape[1]), tile.shape
+            )
+            cand_scores = np.concatenate([best_scores, tile], axis=1)
+            cand_indices = np.concatenate([best_indices, tile_indices], axis=1)
+            if cand_scores.shape[1] > k:
+                keep = np.argpartition(-cand_scores, k - 1, axis=1)[:, :k]
+                cand_scores = np.take_along_axis(cand_scores, keep, axis=1)
+                cand_indices = np.take_along_axis(cand_indices, keep, axis=1)
+            best_scores, best_indices = cand_scores, cand_indices
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        scores[q_start:q_start + block.shape[0]] = np.take_along_axis(best_scores, order, axis=1)
+        indices[q_start:q_start + block.shape[0]] = np.take_along_axis(best_indices, order, axis=1)
+
+    if timed:
+        tracing.record('similarity', similarity_seconds, items=n_queries, batch_size=query_block)
+        tracing.record('top_k', time.perf_counter() - started - similarity_seconds,
+                       items=n_queries, batch_size=query_block)
+    return scores, indices
+
+
+def top_k_indices(scores, k):
+    """Indices of the k highest scores in a 1-D array, best first"""
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    with tracing.span('top_k', items=1):
+        top = np.argpartition(-scores, k - 1)[:k]
+        return top[np.argsort(-scores[top], kind="stable")]
+
+
+def aggregate_chunk_scores(chunk_embeddings, matrix, aggregate="max", top_n=3, clause_block=8192):
+    """
+    Collapse a document's chunk x clause scores into one score per clause
+    Returns:
+        (clause_scores, best_chunk) where best_chunk is the highest-scoring chunk per clause
+    """
+    n_chunks, n_clauses = chunk_embeddings.shape[0], matrix.shape[0]
+    clause_scores = np.empty(n_clauses, dtype=np.float32)
+    best_chunk = np.empty(n_clauses, dtype=np.int64)
+    n = min(top_n, n_chunks)
+
+    with tracing.span('similarity', items=n_chunks, batch_size=n_chunks):
+        for c_start in range(0, n_clauses, clause_block):
+            tile = chunk_embeddings @ np.asarray(matrix[c_start:c_start + clause_block], dtype=np.float32).T
+            c_end = c_start + tile.shape[1]
+            best_chunk[c_start:c_end] = tile.argmax(axis=0)
+            if aggregate == "max":
+                clause_scores[c_start:c_end] = tile.max(axis=0)
+            else:
+                clause_scores[c_start:c_end] = np.partition(tile, n_chunks - n, axis=0)[n_chunks - n:].mean(axis=0)
+
+    return clause_scores, best_chunk
+
+
+class ExactBackend:
+    """
+    Brute-force NumPy search over every clause (recall is always 1.0)
+    Knob: clause_block - larger tiles are faster but use more memory per query block
+    """
+    exhaustive = True
+
+    def __init__(self, query_block=256, clause_block=8192):
+        self.query_block = query_block
+        self.clause_block = clause_block
+        self.embeddings = None
+
+    def build(self, embeddings):
+        self.embeddings = embeddings
+        return self
+
+    def search(self, queries, k):
+        return top_k_scores(queries, self.embeddings, k,
+                            query_block=self.query_block, clause_block=self.clause_block)
+
+
+class IVFBackend:
+    """
+    Inverted-file index: spherical k-means lists, only the nearest lists are scanned
+    Knob: nprobe - lists scanned per query; higher means better recall and more latency
+    """
+    exhaustive = False
+
+    def __init__(self, n_lists=None, nprobe=8, n_iter=10, seed=0):
+        self.n_lists = n_lists
+        self.nprobe = nprobe
+        self.n_iter = n_iter
+        self.seed = seed
+
+    def build(self, embeddings):
+        # Compressed (float16/int8) or memory-mapped matrices are kept as given and expanded per slice
+        data = embeddings
+        n = data.shape[0]
+        self.data = data
+        self.centroids = np.zeros((0, data.shape[1]), dtype=np.float32)
+        self.list_ids = np.empty(0, dtype=np.int64)
+        self.list_offsets = np.zeros(1, dtype=np.int64)
+        if n == 0:
+            return self
+
+        n_lists = min(self.n_lists or max(1, int(np.sqrt(n))), n)
+        rng = np.random.default_rng(self.seed)
+        train = np.asarray(data[np.sort(rng.choice(n, min(n, 256 * n_lists), replace=False))], dtype=np.float32)
+        centroids = train[rng.choice(train.shape[0], n_lists, replace=False)].copy()
+
+        for _ in range(self.n_iter):
+            _, assign = top_k_scores(train, centroids, 1)
+            assign = assign[:, 0]
+            order = np.argsort(assign, kind="stable")
+            filled, starts = np.unique(assign[order], return_index=True)
+            centroids[filled] = normalize_rows(np.add.reduceat(train[order], starts, axis=0))
+
+        _, assign = top_k_scores(data, centroids, 1)
+        assign = assign[:, 0]
+        self.centroids = centroids
+        self.list_ids = np.argsort(assign, kind="stable")
+        self.list_offsets = np.searchsorted(assign[self.list_ids], np.arange(n_lists + 1))
+        return self
+
+    def search(self, queries, k):
+        k = min(k, self.data.shape[0])
+        scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        indices = np.zeros((queries.shape[0], k), dtype=np.int64)
+        if k == 0:
+            return scores, indices
+
+        list_order = np.argsort(-(queries @ self.centroids.T), axis=1)
+        for row, query in enumerate(queries):
+            # Scan at least nprobe lists, and enough lists to yield k candidates
+            candidates = []
+            found = 0
+            for probed, list_id in enumerate(list_order[row]):
+                if probed >= self.nprobe and found >= k:
+                    break
+                ids = self.list_ids[self.list_offsets[list_id]:self.list_offsets[list_id + 1]]
+                candidates.append(ids)
+                found += len(ids)
+            candidates = np.concatenate(candidates)
+            candidate_scores = np.asarray(self.data[candidates], dtype=np.float32) @ query
+            top = np.argpartition(-candidate_scores, k - 1)[:k]
+            top = top[np.argsort(-candidate_scores[top], kind="stable")]
+            scores[row], indices[row] = candidate_scores[top], candidates[top]
+        return scores, indices
+
+
+class HNSWBackend:
+    """
+    HNSW graph index from the optional hnswlib package
+    Knob: ef_search - candidate list size at query time; higher means better recall and more latency
+    """
+    exhaustive = False
+
+    def __init__(self, ef_search=64, ef_construction=200, M=16):
+        self.ef_search = ef_search
+        self.ef_construction = ef_construction
+        self.M = M
+
+    def build(self, embeddings):
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("The HNSW backend requires hnswlib: pip install hnswlib")
+
+        data = np.asarray(embeddings, dtype=np.float32)
+        self.size = data.shape[0]
+        self.index = hnswlib.Index(space="ip", dim=data.shape[1])
+        self.index.init_index(max_elements=max(self.size, 1), ef_construction=self.ef_construction, M=self.M)
+        if self.size:
+            self.index.add_items(data, np.arange(self.size))
+        return self
+
+    def search(self, queries, k):
+        k = min(k, self.size)
+        if k == 0:
+            return (np.empty((queries.shape[0], 0), dtype=np.float32),
+                    np.empty((queries.shape[0], 0), dtype=np.int64))
+        self.index.set_ef(max(self.ef_search, k))
+        labels, distances = self.index.knn_query(queries, k=k)
+        # hnswlib's inner-product distance is 1 - dot product
+        return (1.0 - distances).astype(np.float32), labels.astype(np.int64)
+
+
+RETRIEVAL_BACKENDS = {
+    "exact": ExactBackend,
+    "ivf": IVFBackend,
+    "hnsw": HNSWBackend
+}
+
+
+def get_backend(name, **options):
+    """Create a retrieval backend by name ('exact', 'ivf' or 'hnsw')"""
+    if name not in RETRIEVAL_BACKENDS:
+        raise ValueError(f"Unknown retrieval backend: {name}")
+    return RETRIEVAL_BACKENDS[name](**options)
+
+
 class MatchEngine:
-    def __init__(self):
-        # Authenticate with Hugging Face
-        self.model = SentenceTransformer(
-            'sentence-transformers/all-MiniLM-L6-v2',
-            use_auth_token=os.getenv('HUGGINGFACEHUB_API_TOKEN')
-        )
-        self.document_parser = DocumentParser()
+    def __init__(self, batch_size=64, query_block_size=256, clause_block_size=8192,
+                 chunk_mode="paragraph", chunk_words=DEFAULT_MAX_WORDS, chunk_overlap=DEFAULT_OVERLAP,
+                 backend=None, candidate_factor=4, use_cache=True, model=None, model_name=MATCH_ENCODER,
+                 encoder_backend=None, storage=EMBEDDING_STORAGE, rerank_factor=EMBEDDING_RERANK,
+                 hybrid_min_clauses=HYBRID_MIN_CLAUSES, lexical_candidates=HYBRID_CANDIDATES,
+                 cascade=CASCADE_ENCODER, cascade_candidates=CASCADE_CANDIDATES):
+        # Shared per process: engines created on every Streamlit rerun reuse the loaded model.
+        # Any object with encode(texts, batch_size=...) can be passed as model (e.g. a benchmark stub);
+        # model_name keeps its persisted vectors apart from other models'.
+        if model is None:
+            # model_name may be an ENCODERS alias or 'model@backend'; ENCODER_BACKEND picks fp32
+            # torch or a quantized/ONNX path otherwise. Each model/backend gets its own vectors.
+            model_name, encoder_backend = resolve_encoder(model_name, encoder_backend)
+            model = get_encoder(model_name, encoder_backend)
+            model_name = encoder_key(model_name, encoder_backend)
+        self.model_name = model_name
+        self.model = model
+        self.document_parser = document_parser
         self.regulation_loader = RegulationLoader()
+        # float16/int8 storage scores on the compressed matrix, then re-ranks
+        # the top_k * rerank_factor shortlist on the float32 rows (0 disables it)
+        self.clause_index = ClauseEmbeddingIndex(self.model, model_name, storage=storage)
+        self.rerank_factor = rerank_factor
+        self.batch_size = batch_size
+        self.query_block_size = query_block_size
+        self.clause_block_size = clause_block_size
+        self.chunk_mode = chunk_mode
+        self.chunk_words = chunk_words
+        self.chunk_overlap = chunk_overlap
+        # Exact NumPy search unless RETRIEVAL_BACKEND or an explicit backend says otherwise
+        if backend is None:
+            name = os.getenv('RETRIEVAL_BACKEND', 'exact')
+            options = {"query_block": query_block_size, "clause_block": clause_block_size} if name == "exact" else {}
+            backend = get_backend(name, **options)
+        self.backend = backend
+        self.candidate_factor = candidate_factor
+        # Large libraries are pre-filtered lexically (BM25 + citations, see api.lexical) and
+        # only the candidates are scored densely; 0 disables the pre-filter
+        self.hybrid_min_clauses = hybrid_min_clauses
+        self.lexical_candidates = lexical_candidates
+        # Cascade: a cheap encoder (alias, name or MatchEngine) shortlists cascade_candidates
+        # clauses per document and this engine's model re-scores only those
+        if isinstance(cascade, str):
+            cascade = MatchEngine(
+                batch_size=batch_size, query_block_size=query_block_size, clause_block_size=clause_block_size,
+                chunk_mode=chunk_mode, chunk_words=chunk_words, chunk_overlap=chunk_overlap,
+                candidate_factor=candidate_factor, use_cache=use_cache, model_name=cascade, storage=storage,
+                rerank_factor=rerank_factor, hybrid_min_clauses=hybrid_min_clauses,
+                lexical_candidates=lexical_candidates, cascade=None
+            ) if cascade else None
+        self.triage = cascade
+        self.cascade_candidates = cascade_candidates
+        # Document/chunk vectors keyed by text hash, so unchanged texts are never re-encoded
+        self.embedding_cache = EmbeddingCache(storage=storage) if use_cache else None
+        self._backend_fingerprint = None
 
     def calculate_similarity(self, control_text, regulation_texts):
         """Calculate semantic similarity between control and regulations"""
@@ -31,81 +320,663 @@ class MatchEngine:
         similarities = cosine_similarity(control_embedding, regulation_embeddings)
         return similarities[0]
 
-    def load_and_match(self):
+    def load_and_match(self, incremental=False):
         """Load data from parser/loader and run matching"""
-        # Step 1: Get document texts from document_parser
-        control_texts = self.document_parser.extract_text_from_files()
+        # Step 1: Load regulations from regulation_loader
+        regulations = self.regulation_loader.load()
         
-        # Step 2: Load regulations from regulation_loader
-        regulations = self.regulation_loader.load("data/regulations.json")
+        # Incremental mode scores only new documents / changed regulations and stores them itself
+        if incremental:
+            return self.incremental_match(regulations)
+        
+        # Step 2: Get document texts from document_parser
+        control_texts = self.document_parser.extract_text_from_files()
         
         # Step 3: Match them
         results = self.match_controls_to_regulations(control_texts, regulations)
         
         return results
     
-    def match_controls_to_regulations(self, control_texts, regulations):
-        """Match each control to all regulatory clauses"""
+    def _build_backend(self, index):
+        """(Re)build the retrieval backend whenever the clause index changes"""
+        state = (index.fingerprint, int(index.encoded.sum()))
+        if self._backend_fingerprint != state:
+            self.backend.build(index.embeddings)
+            self._backend_fingerprint = state
+        return self.backend
+
+    def _rerank(self, index, chunk_embeddings, rows, top_k, aggregate, top_n):
+        """
+        Re-score shortlisted clause rows on the float32 matrix
+        Returns:
+            (scores, rows, best_chunk) for the top_k rows, best first
+        """
+        rows = np.sort(rows)  # ascending rows read the memory-mapped file sequentially
+        scores, best_chunk = aggregate_chunk_scores(
+            chunk_embeddings, np.asarray(index.exact[rows], dtype=np.float32),
+            aggregate=aggregate, top_n=top_n, clause_block=self.clause_block_size
+        )
+        top = top_k_indices(scores, top_k)
+        return scores[top], rows[top], best_chunk[top]
+
+    def encode_texts(self, texts):
+        """Encode texts in one batched call and L2-normalize the embeddings, reusing cached vectors"""
+        with tracing.span('control_encoding', items=len(texts), batch_size=self.batch_size):
+            return self._encode_texts(texts)
+
+    def _encode_texts(self, texts):
+        if self.embedding_cache is None:
+            return normalize_rows(self.model.encode(texts, batch_size=self.batch_size))
+        
+        hashes = [text_sha256(text) for text in texts]
+        vectors = self.embedding_cache.get_many(self.model_name, hashes)
+        missing = {}
+        for text, text_hash in zip(texts, hashes):
+            if text_hash not in vectors:
+                missing.setdefault(text_hash, text)
+        
+        if missing:
+            embeddings = normalize_rows(self.model.encode(list(missing.values()), batch_size=self.batch_size))
+            # Use the vectors as stored, so a first run scores exactly like later cached runs
+            embeddings = self.embedding_cache.put_many(self.model_name, list(missing), embeddings)
+            vectors.update(zip(missing, embeddings))
+        
+        return np.vstack([vectors[text_hash] for text_hash in hashes])
+
+    def match_controls_to_regulations(self, control_texts, regulations, top_k=5, scope=None, branch=None):
+        """Match each control to all regulatory clauses (or those in scope / the branch's scope)"""
+        documents = [{"text": text} for text in control_texts]
+        return self.match_documents(documents, regulations, top_k=top_k, scope=scope, branch=branch)
+
+    def match_documents(self, documents, regulations, top_k=5, aggregate="max", top_n=3,
+                        scope=None, per_regulation=False, branch=None, columnar=False):
+        """
+        Match control documents chunk by chunk against all regulatory clauses
+        Args:
+            documents: Dicts with 'text' and optional 'page_offsets', as returned by parse_controls
+            regulations: RegulationStore or regulations dict from RegulationLoader.load()
+            top_k: Number of clauses kept per document (per regulation if per_regulation)
+            aggregate: 'max' (best chunk) or 'mean' (mean of the top_n best chunks) per clause
+            top_n: Chunks averaged per clause when aggregate='mean'
+            scope: Optional regulation names and/or jurisdictions (e.g. ['DPDP', 'EU']); only
+                   their clauses are encoded and scored
+            per_regulation: Keep the top_k clauses of every regulation instead of overall
+            branch: Derive scope from the branch -> regulations mapping when scope is None
+            columnar: Return a MatchTable (see api.match_table) instead of result dicts
+        Returns:
+            One {document_id, control_text, matches} dict per non-empty document; every match
+            names the chunk_index, page and char_offset of its best evidence chunk. When at
+            least hybrid_min_clauses clauses are in scope, matches are ranked by fusion_score
+            and say whether the document cited the clause
+        """
+        if aggregate not in ("max", "mean"):
+            raise ValueError(f"Unsupported aggregate: {aggregate}")
         results = []
         
-        # Flatten all regulatory clauses
-        reg_clauses = []
-        reg_metadata = []
-        for reg_name, reg_data in regulations.items():
-            for clause_id, clause_text in reg_data['clauses'].items():
-                reg_clauses.append(clause_text)
-                reg_metadata.append((reg_name, clause_id, reg_data['description']))
+        store = as_store(regulations)
+        if scope is None and branch is not None:
+            scope = branch_scope(branch)
+        names = store.resolve_scope(scope) if scope is not None else None
         
-        for control_text in control_texts:
-            if not control_text.strip():
-                continue
-                
-            similarities = self.calculate_similarity(control_text, reg_clauses)
-            top_indices = np.argsort(similarities)[::-1][:5]  # Top 5 matches
-            
+        # Clause embeddings come from the persisted index, encoded once per clause text;
+        # a scoped run leaves clauses of other regulations unencoded. A cascade needs no
+        # index for this model: only shortlisted clauses are encoded, through the cache
+        index = self.clause_index.build(store, scope=names) if self.triage is None else None
+        
+        documents = [doc for doc in documents if doc.get("text", "").strip()]
+        scope_rows = store.rows(names) if names is not None else None
+        if not documents:
+            return MatchTable.from_arrays(store, [], [], [], [], scope_rows) if columnar else results
+        
+        # Chunk every document, then encode all chunks in batched calls
+        doc_chunks = [
+            chunk_text(doc["text"], doc.get("page_offsets"), mode=self.chunk_mode,
+                       max_words=self.chunk_words, overlap=self.chunk_overlap)
+            for doc in documents
+        ]
+        starts = np.cumsum([0] + [len(chunks) for chunks in doc_chunks])
+        chunk_embeddings = self.encode_texts(
+            [chunk["text"] for chunks in doc_chunks for chunk in chunks]
+        )
+        
+        doc_scores = [None] * len(documents)
+        doc_indices = [None] * len(documents)
+        doc_evidence = [None] * len(documents)
+        # Compressed scores pick a wider shortlist that is re-ranked on float32 rows
+        rerank = index is not None and index.compressed and self.rerank_factor > 0
+        shortlist_k = top_k * self.rerank_factor if rerank else top_k
+        # Hybrid mode: per-document lexical candidates, ranked by fused dense/lexical scores
+        in_scope = len(scope_rows) if scope_rows is not None else len(store)
+        hybrid = index is not None and 0 < self.hybrid_min_clauses <= in_scope and not per_regulation
+        doc_fusion = [None] * len(documents)
+        doc_cited = [None] * len(documents)
+        
+        if self.triage is not None:
+            picks = self._cascade(documents, store, names, per_regulation, top_k, aggregate, top_n,
+                                  chunk_embeddings, starts)
+            for i, (scores, rows, best_chunk) in enumerate(picks):
+                doc_scores[i], doc_indices[i], doc_evidence[i] = scores, rows, best_chunk
+        elif hybrid:
+            lexical = get_lexical_index(store)
+            mask = None
+            if scope_rows is not None:
+                mask = np.zeros(len(store), dtype=bool)
+                mask[scope_rows] = True
+            # Candidates are few, so the dense stage can read float32 rows directly
+            dense_matrix = index.exact if rerank else index.embeddings
+            # Fallback for documents with too little word overlap to pre-filter: every clause
+            # in scope, read tile by tile; a scoped matrix is gathered once, on first use
+            scope_matrix = None
+            for i, doc in enumerate(documents):
+                lexical_scores = lexical.scores(doc["text"])
+                cited = lexical.citations(doc["text"])
+                candidates = lexical.shortlist(lexical_scores, cited, self.lexical_candidates, mask)
+                if len(candidates) < top_k:
+                    if scope_rows is None:
+                        candidates, candidate_matrix = np.arange(len(store)), dense_matrix
+                    else:
+                        if scope_matrix is None:
+                            scope_matrix = take_rows(dense_matrix, scope_rows)
+                        candidates, candidate_matrix = scope_rows, scope_matrix
+                else:
+                    candidate_matrix = take_rows(dense_matrix, candidates)
+                dense, best_chunk = aggregate_chunk_scores(
+                    chunk_embeddings[starts[i]:starts[i + 1]], candidate_matrix,
+                    aggregate=aggregate, top_n=top_n, clause_block=self.clause_block_size
+                )
+                is_cited = np.isin(candidates, cited)
+                fused = fuse(dense, lexical_scores[candidates], is_cited)
+                top = top_k_indices(fused, top_k)
+                doc_scores[i], doc_indices[i], doc_evidence[i] = dense[top], candidates[top], best_chunk[top]
+                doc_fusion[i], doc_cited[i] = fused[top], is_cited[top]
+        elif names is not None or per_regulation:
+            # Score only the scoped regulations' clause columns, exactly
+            if names is None:
+                names = store.regulation_names
+            segments = [index.regulation_slices[name] for name in names]
+            columns = store.rows(names)
+            clause_matrix = take_rows(index.embeddings, columns)
+            bounds = np.cumsum([0] + [end - start for start, end in segments])
+            groups = list(zip(bounds[:-1], bounds[1:])) if per_regulation else [(0, len(columns))]
+            for i in range(len(documents)):
+                embeddings = chunk_embeddings[starts[i]:starts[i + 1]]
+                clause_scores, best_chunk = aggregate_chunk_scores(
+                    embeddings, clause_matrix,
+                    aggregate=aggregate, top_n=top_n, clause_block=self.clause_block_size
+                )
+                picks = [(np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64))]
+                for lo, hi in groups:
+                    top = lo + top_k_indices(clause_scores[lo:hi], shortlist_k)
+                    if rerank:
+                        picks.append(self._rerank(index, embeddings, columns[top], top_k, aggregate, top_n))
+                    else:
+                        picks.append((clause_scores[top], columns[top], best_chunk[top]))
+                doc_scores[i], doc_indices[i], doc_evidence[i] = (np.concatenate(parts) for parts in zip(*picks))
+        else:
+            backend = self._build_backend(index)
+            # Single-chunk documents need no aggregation: score them as one matrix
+            single = [i for i, chunks in enumerate(doc_chunks) if len(chunks) == 1]
+            if single:
+                queries = chunk_embeddings[starts[single]]
+                scores, indices = backend.search(queries, shortlist_k)
+                for row, i in enumerate(single):
+                    if rerank:
+                        doc_scores[i], doc_indices[i], doc_evidence[i] = self._rerank(
+                            index, queries[row:row + 1], indices[row], top_k, aggregate, top_n
+                        )
+                        continue
+                    doc_scores[i], doc_indices[i] = scores[row], indices[row]
+                    doc_evidence[i] = np.zeros(len(indices[row]), dtype=np.int64)
+        
+            for i, chunks in enumerate(doc_chunks):
+                if len(chunks) == 1:
+                    continue
+                embeddings = chunk_embeddings[starts[i]:starts[i + 1]]
+                if backend.exhaustive:
+                    candidates = np.arange(index.embeddings.shape[0])
+                    clause_matrix = index.embeddings
+                else:
+                    # Approximate backends shortlist clauses per chunk; aggregate exactly over the union
+                    _, shortlist = backend.search(embeddings, top_k * self.candidate_factor)
+                    candidates = np.unique(shortlist)
+                    clause_matrix = take_rows(index.embeddings, candidates)
+                clause_scores, best_chunk = aggregate_chunk_scores(
+                    embeddings, clause_matrix,
+                    aggregate=aggregate, top_n=top_n, clause_block=self.clause_block_size
+                )
+                top = top_k_indices(clause_scores, shortlist_k)
+                if rerank:
+                    doc_scores[i], doc_indices[i], doc_evidence[i] = self._rerank(
+                        index, embeddings, candidates[top], top_k, aggregate, top_n
+                    )
+                    continue
+                doc_scores[i], doc_indices[i], doc_evidence[i] = clause_scores[top], candidates[top], best_chunk[top]
+        
+        if columnar:
+            chunk_numbers = [
+                np.array([chunk["chunk_index"] for chunk in chunks], dtype=np.int64)[evidence]
+                for chunks, evidence in zip(doc_chunks, doc_evidence)
+            ]
+            return MatchTable.from_arrays(store, documents, doc_scores, doc_indices, chunk_numbers, scope_rows)
+        
+        for i, doc in enumerate(documents):
             matches = []
-            for idx in top_indices:
-                matches.append({
-                    "regulation": reg_metadata[idx][0],
-                    "regulation_description": reg_metadata[idx][2],
-                    "clause_id": reg_metadata[idx][1],
-                    "clause_text": reg_clauses[idx],
-                    "similarity_score": float(similarities[idx])
-                })
+            for rank, (idx, score, chunk_idx) in enumerate(zip(doc_indices[i], doc_scores[i], doc_evidence[i])):
+                match = self._format_match(store, idx, score, doc_chunks[i][chunk_idx])
+                if doc_fusion[i] is not None:
+                    match["fusion_score"] = float(doc_fusion[i][rank])
+                    match["cited"] = bool(doc_cited[i][rank])
+                matches.append(match)
             
             results.append({
-                "control_text": control_text,
+                "document_id": doc.get("id"),
+                "control_text": doc["text"],
                 "matches": matches
             })
         
         return results
 
-    def save_results(self, results, db_path="data/compliance.db"):
-        """Save results to SQLite database with proper foreign keys"""
-        conn = sqlite3.connect(db_path)
+    def _cascade(self, documents, store, names, per_regulation, top_k, aggregate, top_n, chunk_embeddings, starts):
+        """
+        Re-score the triage engine's shortlist with this engine's model
+        Returns:
+            (scores, rows, best_chunk) per document, top_k best first (per regulation if per_regulation)
+        """
+        shortlist = self.triage.match_documents(
+            documents, store, top_k=self.cascade_candidates, aggregate=aggregate, top_n=top_n,
+            scope=names, per_regulation=per_regulation, columnar=True
+        )
+        # Clause vectors of this model are cached by text hash like document chunks
+        rows = np.unique(shortlist.clause)
+        with tracing.span('clause_encoding', items=len(rows), batch_size=self.batch_size):
+            clause_vectors = self._encode_texts([store.texts[row] for row in rows]) if len(rows) else None
+        positions = np.searchsorted(rows, shortlist.clause)
+        # MatchTable rows are grouped by document
+        bounds = np.searchsorted(shortlist.doc, np.arange(len(documents) + 1))
+        
+        picks = []
+        for i in range(len(documents)):
+            lo, hi = bounds[i], bounds[i + 1]
+            candidates = shortlist.clause[lo:hi]
+            if not len(candidates):
+                picks.append((np.empty(0, dtype=np.float32), candidates, np.empty(0, dtype=np.int64)))
+                continue
+            scores, best_chunk = aggregate_chunk_scores(
+                chunk_embeddings[starts[i]:starts[i + 1]], clause_vectors[positions[lo:hi]],
+                aggregate=aggregate, top_n=top_n, clause_block=self.clause_block_size
+            )
+            if per_regulation:
+                regulation = store.regulation_index[candidates]
+                top = np.concatenate([
+                    group[top_k_indices(scores[group], top_k)]
+                    for group in (np.flatnonzero(regulation == r) for r in np.unique(regulation))
+                ])
+            else:
+                top = top_k_indices(scores, top_k)
+            picks.append((scores[top], candidates[top], best_chunk[top]))
+        return picks
+
+    def match_coverage(self, documents, regulations, top_k=1, aggregate="max", top_n=3,
+                       scope=None, branch=None, document_block=64):
+        """
+        Reverse matching: the top_k best supporting documents for every clause
+        Documents are chunked and encoded document_block at a time; each block's
+        clause x document scores (aggregated over chunks as in match_documents)
+        are merged into a running column-wise top-k per clause, so memory stays
+        at clauses x (top_k + document_block) whatever the corpus size.
+        Args:
+            documents: Dicts with 'text' and optional 'id' / 'page_offsets'
+            regulations: RegulationStore or regulations dict
+            top_k: Documents kept per clause
+            scope / branch: Restrict to the clauses in scope, as in match_documents
+        Returns:
+            MatchTable with up to top_k rows per in-scope clause; clauses without
+            rows had no documents to match and are reported as gaps by
+            utils.aggregation. With float16/int8 storage the scores come from
+            the compressed matrix. With a cascade they come from the triage
+            engine: re-scoring every clause would have this engine's model
+            encode the whole library, which the cascade exists to avoid.
+        """
+        if aggregate not in ("max", "mean"):
+            raise ValueError(f"Unsupported aggregate: {aggregate}")
+        if self.triage is not None:
+            return self.triage.match_coverage(documents, regulations, top_k=top_k, aggregate=aggregate,
+                                              top_n=top_n, scope=scope, branch=branch,
+                                              document_block=document_block)
+        
+        store = as_store(regulations)
+        if scope is None and branch is not None:
+            scope = branch_scope(branch)
+        names = store.resolve_scope(scope) if scope is not None else None
+        index = self.clause_index.build(store, scope=names)
+        rows = store.rows(names)
+        clause_matrix = take_rows(index.embeddings, rows) if names is not None else index.embeddings
+        
+        documents = [doc for doc in documents if doc.get("text", "").strip()]
+        n_clauses = len(rows)
+        best_scores = np.full((n_clauses, 0), -np.inf, dtype=np.float32)
+        best_docs = np.empty((n_clauses, 0), dtype=np.int64)
+        best_chunks = np.empty((n_clauses, 0), dtype=np.int64)
+        
+        for d_start in range(0, len(documents), document_block):
+            block = documents[d_start:d_start + document_block]
+            doc_chunks = [
+                chunk_text(doc["text"], doc.get("page_offsets"), mode=self.chunk_mode,
+                           max_words=self.chunk_words, overlap=self.chunk_overlap)
+                for doc in block
+            ]
+            starts = np.cumsum([0] + [len(chunks) for chunks in doc_chunks])
+            chunk_embeddings = self.encode_texts([chunk["text"] for chunks in doc_chunks for chunk in chunks])
+            
+            # One column per document of the block: its aggregated score for every clause
+            block_scores = np.full((n_clauses, len(block)), -np.inf, dtype=np.float32)
+            block_chunks = np.zeros((n_clauses, len(block)), dtype=np.int64)
+            for j, chunks in enumerate(doc_chunks):
+                if not chunks:
+                    continue
+                scores, best_chunk = aggregate_chunk_scores(
+                    chunk_embeddings[starts[j]:starts[j + 1]], clause_matrix,
+                    aggregate=aggregate, top_n=top_n, clause_block=self.clause_block_size
+                )
+                block_scores[:, j] = scores
+                block_chunks[:, j] = np.array([chunk["chunk_index"] for chunk in chunks])[best_chunk]
+            
+            with tracing.span('top_k', items=n_clauses, batch_size=len(block)):
+                cand_scores = np.concatenate([best_scores, block_scores], axis=1)
+                cand_docs = np.concatenate(
+                    [best_docs, np.broadcast_to(np.arange(d_start, d_start + len(block)), block_scores.shape)], axis=1
+                )
+                cand_chunks = np.concatenate([best_chunks, block_chunks], axis=1)
+                if cand_scores.shape[1] > top_k:
+                    keep = np.argpartition(-cand_scores, top_k - 1, axis=1)[:, :top_k]
+                    cand_scores = np.take_along_axis(cand_scores, keep, axis=1)
+                    cand_docs = np.take_along_axis(cand_docs, keep, axis=1)
+                    cand_chunks = np.take_along_axis(cand_chunks, keep, axis=1)
+                best_scores, best_docs, best_chunks = cand_scores, cand_docs, cand_chunks
+        
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        best_scores = np.take_along_axis(best_scores, order, axis=1)
+        best_docs = np.take_along_axis(best_docs, order, axis=1)
+        best_chunks = np.take_along_axis(best_chunks, order, axis=1)
+        found = np.isfinite(best_scores)
+        return MatchTable(
+            store,
+            np.array([doc.get("id") or -1 for doc in documents], dtype=np.int64),
+            [doc["text"] for doc in documents],
+            best_docs[found],
+            np.broadcast_to(rows[:, None], best_scores.shape)[found],
+            best_scores[found],
+            best_chunks[found],
+            rows
+        )
+
+    def match_stream(self, pages, regulations, top_k=5, aggregate="max", top_n=3, document_id=None):
+        """
+        Match one document supplied as a stream of (page, text) units
+        Chunks are encoded batch_size at a time and folded into running
+        per-clause scores, so memory is bounded by one batch plus a few
+        arrays over the clause index, whatever the document size. With
+        compressed storage the chunk vectors are also kept (dim floats per
+        chunk) to re-rank the shortlist on the float32 rows, as match_documents does.
+        With a cascade the triage engine folds the running scores and this
+        engine's chunk vectors are kept to re-score its cascade_candidates shortlist.
+        Returns:
+            A {control_text, matches, chunks} dict; control_text holds only the
+            first chunk, since the full text is never materialized
+        """
+        if aggregate not in ("max", "mean"):
+            raise ValueError(f"Unsupported aggregate: {aggregate}")
+        
+        # A cascade folds on the triage model's index; this model only sees the shortlist
+        scorer = self.triage if self.triage is not None else self
+        index = scorer.clause_index.build(regulations)
+        backend = scorer._build_backend(index)
+        n_clauses = index.embeddings.shape[0]
+        best = np.full(n_clauses, -np.inf, dtype=np.float32)
+        best_chunk = np.full(n_clauses, -1, dtype=np.int64)
+        best_n = np.full((top_n, n_clauses), -np.inf, dtype=np.float32) if aggregate == "mean" else None
+        evidence = []  # (chunk_index, page, char_offset) per chunk, without the text
+        preview = ""
+        rerank = index.compressed and scorer.rerank_factor > 0 and self.triage is None
+        kept = []
+        
+        def fold(batch):
+            texts = [chunk["text"] for chunk in batch]
+            embeddings = scorer.encode_texts(texts)
+            if self.triage is not None:
+                kept.append(self.encode_texts(texts))
+            elif rerank:
+                kept.append(embeddings)
+            if backend.exhaustive:
+                columns = np.arange(n_clauses)
+            else:
+                columns = np.unique(backend.search(embeddings, top_k * scorer.candidate_factor)[1])
+            with tracing.span('similarity', items=len(batch), batch_size=len(batch)):
+                for c_start in range(0, len(columns), self.clause_block_size):
+                    cols = columns[c_start:c_start + self.clause_block_size]
+                    tile = embeddings @ np.asarray(index.embeddings[cols], dtype=np.float32).T
+                    tile_best = tile.max(axis=0)
+                    improved = tile_best > best[cols]
+                    best[cols[improved]] = tile_best[improved]
+                    best_chunk[cols[improved]] = batch[0]["chunk_index"] + tile.argmax(axis=0)[improved]
+                    if best_n is not None:
+                        stacked = np.vstack([best_n[:, cols], tile])
+                        best_n[:, cols] = -np.sort(-stacked, axis=0)[:top_n]
+        
+        batch = []
+        for chunk in iter_chunks(pages, mode=self.chunk_mode, max_words=self.chunk_words,
+                                 overlap=self.chunk_overlap):
+            if not evidence:
+                preview = chunk["text"]
+            evidence.append({key: chunk[key] for key in ("chunk_index", "page", "char_offset")})
+            batch.append(chunk)
+            if len(batch) >= self.batch_size:
+                fold(batch)
+                batch = []
+        if batch:
+            fold(batch)
+        
+        if best_n is not None:
+            # Average the best top_n chunk scores a clause received (fewer for short documents)
+            seen = np.where(np.isfinite(best_n), best_n, np.nan)
+            counts = np.isfinite(best_n).sum(axis=0)
+            scores = np.full(n_clauses, -np.inf, dtype=np.float32)
+            scores[counts > 0] = np.nanmean(seen[:, counts > 0], axis=0)
+        else:
+            scores = best
+        
+        scored = np.flatnonzero(np.isfinite(scores))
+        if self.triage is not None and len(scored):
+            shortlist = np.sort(scored[top_k_indices(scores[scored], self.cascade_candidates)])
+            with tracing.span('clause_encoding', items=len(shortlist), batch_size=self.batch_size):
+                clause_vectors = self._encode_texts([index.store.texts[row] for row in shortlist])
+            cascade_scores, cascade_chunks = aggregate_chunk_scores(
+                np.vstack(kept), clause_vectors, aggregate=aggregate, top_n=top_n, clause_block=self.clause_block_size
+            )
+            picked = top_k_indices(cascade_scores, top_k)
+            top_scores, top, top_chunks = cascade_scores[picked], shortlist[picked], cascade_chunks[picked]
+        elif rerank and len(scored):
+            shortlist = scored[top_k_indices(scores[scored], top_k * self.rerank_factor)]
+            top_scores, top, top_chunks = self._rerank(index, np.vstack(kept), shortlist, top_k, aggregate, top_n)
+        else:
+            top = scored[top_k_indices(scores[scored], top_k)]
+            top_scores, top_chunks = scores[top], best_chunk[top]
+        
+        return {
+            "document_id": document_id,
+            "control_text": preview,
+            "matches": [
+                self._format_match(index.store, idx, score, evidence[chunk])
+                for idx, score, chunk in zip(top, top_scores, top_chunks)
+            ],
+            "chunks": len(evidence)
+        }
+
+    def match_file(self, file_path, regulations, **options):
+        """Stream a PDF/DOCX/TXT file page by page through match_stream"""
+        result = self.match_stream(self.document_parser.iter_pages_from_file(file_path), regulations, **options)
+        result["source"] = file_path
+        return result
+
+    def _format_match(self, store, idx, score, chunk):
+        regulation, clause_id, description = store.clause_metadata(idx)
+        return {
+            "regulation": regulation,
+            "regulation_description": description,
+            "clause_id": clause_id,
+            "clause_text": store.texts[idx],
+            "similarity_score": float(score),
+            "chunk_index": chunk["chunk_index"],
+            "page": chunk["page"],
+            "char_offset": chunk["char_offset"]
+        }
+
+    def save_results(self, results, db_path=db.DB_PATH, batch_size=5000):
+        """
+        Save results to SQLite database with proper foreign keys
+        Rows are written with executemany, one transaction per batch_size rows.
+        Results without a document_id are resolved through documents.text_hash.
+        """
+        conn = db.get_connection(db_path)
         cursor = conn.cursor()
         
-        # Get document IDs for each control text
-        text_to_id = {}
-        cursor.execute("SELECT id, processed_text FROM documents")
-        for doc_id, text in cursor.fetchall():
-            text_to_id[text] = doc_id
+        # Fallback for results that did not come from parse_controls: look up by text hash
+        result_hashes = {}
+        for result in results:
+            if not result.get("document_id"):
+                result_hashes[id(result)] = text_sha256(result["control_text"])
+        hash_to_id = {}
+        unique_hashes = list(set(result_hashes.values()))
+        for start in range(0, len(unique_hashes), 500):
+            batch = unique_hashes[start:start + 500]
+            placeholders = ",".join("?" * len(batch))
+            cursor.execute(f"SELECT id, text_hash FROM documents WHERE text_hash IN ({placeholders})", batch)
+            for doc_id, text_hash in cursor.fetchall():
+                hash_to_id.setdefault(text_hash, doc_id)
+        
+        def rows():
+            for result in results:
+                doc_id = result.get("document_id") or hash_to_id.get(result_hashes.get(id(result)))
+                if not doc_id:
+                    continue
+                for match in result["matches"]:
+                    yield (doc_id, match["regulation"], match["clause_id"], match["similarity_score"])
         
         # Insert matches with document_id foreign key
-        for result in results:
-            doc_id = text_to_id.get(result["control_text"])
-            if not doc_id:
-                continue
-                
-            for match in result["matches"]:
-                cursor.execute('''
+        pending = rows()
+        while True:
+            batch = list(islice(pending, batch_size))
+            if not batch:
+                break
+            with tracing.span('result_save', items=len(batch), batch_size=batch_size), conn:
+                conn.executemany('''
                     INSERT INTO processing_results (
-                        document_id, 
-                        regulation_name, 
-                        clause_id, 
+                        document_id,
+                        regulation_name,
+                        clause_id,
                         similarity_score
                     ) VALUES (?, ?, ?, ?)
-                ''', (doc_id, match["regulation"], match["clause_id"], match["similarity_score"]))
+                ''', batch)
+
+    def incremental_match(self, regulations, company_name=None, top_k=5, batch_documents=64):
+        """
+        Score only (document, regulation) pairs that are new or out of date
+        Each regulation is versioned by a hash of its own content. A new
+        document is scored against every regulation in its branch's scope (all
+        regulations for unmapped branches); a changed regulation is rescored
+        for every document in scope, but only over its own clause columns.
+        The top_k clauses per (document, regulation) replace earlier rows in
+        processing_results, so an unchanged corpus is a no-op.
+        Returns:
+            Summary with documents_scored, pairs_scored and regulations_removed
+        """
+        self.document_parser.init_db()
+        regulations = as_store(regulations)
+        versions = regulations.versions
+        summary = {"documents_scored": 0, "pairs_scored": 0, "regulations_removed": []}
+        
+        conn = db.get_connection(self.document_parser.DB_PATH)
+        cursor = conn.cursor()
         
+        # Drop results for regulations that no longer exist
+        cursor.execute("SELECT DISTINCT regulation_name FROM match_state")
+        removed = [row[0] for row in cursor.fetchall() if row[0] not in versions]
+        for name in removed:
+            cursor.execute('''
+                DELETE FROM processing_results WHERE regulation_name = ? AND document_id IN (
+                    SELECT document_id FROM match_state WHERE regulation_name = ?
+                )
+            ''', (name, name))
+            cursor.execute("DELETE FROM match_state WHERE regulation_name = ?", (name,))
         conn.commit()
-        conn.close()
\ No newline at end of file
+        summary["regulations_removed"] = removed
+        
+        # Work out which regulations each document still needs
+        if company_name:
+            cursor.execute(
+                "SELECT id, branch_location FROM documents WHERE processed_text IS NOT NULL AND company_name = ?",
+                (company_name,)
+            )
+        else:
+            cursor.execute("SELECT id, branch_location FROM documents WHERE processed_text IS NOT NULL")
+        doc_branches = cursor.fetchall()
+        
+        scored = {}
+        cursor.execute("SELECT document_id, regulation_name, regulation_version, model_name FROM match_state")
+        for doc_id, name, version, model_name in cursor.fetchall():
+            if model_name == self.model_name:
+                scored.setdefault(doc_id, {})[name] = version
+        
+        branch_names = {}
+        stale_groups = {}
+        for doc_id, branch in doc_branches:
+            if branch not in branch_names:
+                scope = branch_scope(branch)
+                branch_names[branch] = regulations.resolve_scope(scope) if scope is not None \
+                    else regulations.regulation_names
+            done = scored.get(doc_id, {})
+            stale = tuple(name for name in branch_names[branch] if done.get(name) != versions[name])
+            if stale:
+                stale_groups.setdefault(stale, []).append(doc_id)
+        
+        # Rescore each group of documents over its stale regulations only, committing per batch
+        for stale, ids in stale_groups.items():
+            for start in range(0, len(ids), batch_documents):
+                batch = ids[start:start + batch_documents]
+                placeholders = ",".join("?" * len(batch))
+                cursor.execute(f"SELECT id, processed_text FROM documents WHERE id IN ({placeholders})", batch)
+                documents = [{"id": doc_id, "text": text} for doc_id, text in cursor.fetchall()]
+                results = self.match_documents(documents, regulations, top_k=top_k,
+                                               scope=stale, per_regulation=True)
+                
+                rows = []
+                for result in results:
+                    rows.extend(
+                        (result["document_id"], match["regulation"], match["clause_id"], match["similarity_score"])
+                        for match in result["matches"]
+                    )
+                pairs = [(doc_id, name) for doc_id in batch for name in stale]
+                
+                with tracing.span('result_save', items=len(rows), batch_size=len(rows)):
+                    cursor.executemany(
+                        "DELETE FROM processing_results WHERE document_id = ? AND regulation_name = ?", pairs
+                    )
+                    cursor.executemany('''
+                        INSERT INTO processing_results (
+                            document_id, 
+                            regulation_name, 
+                            clause_id, 
+                            similarity_score
+                        ) VALUES (?, ?, ?, ?)
+                    ''', rows)
+                    cursor.executemany('''
+                        INSERT OR REPLACE INTO match_state (
+                            document_id, regulation_name, regulation_version, model_name
+                        ) VALUES (?, ?, ?, ?)
+                    ''', [(doc_id, name, versions[name], self.model_name) for doc_id, name in pairs])
+                    conn.commit()
+                
+                summary["documents_scored"] += len(batch)
+                summary["pairs_scored"] += len(pairs)
+        
+        return summary
@@ -0,0 +1,135 @@
+# api/match_table.py
+"""
+Columnar match results
+
+A MatchTable holds one row per (document, clause) match in parallel NumPy
+columns instead of nested result dicts, so aggregations over every match
+(see utils.aggregation) are single vectorized passes. Clause rows index the
+RegulationStore the matches were scored against.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+from api.regulation_store import RegulationStore, as_store
+
+
+class MatchTable:
+    """
+    Match rows as columns
+    Args:
+        store: RegulationStore whose rows the clause column indexes
+        document_ids: Database id per document (-1 when unknown)
+        control_texts: Text per document
+        doc: Document position (into document_ids/control_texts) per match
+        clause: Clause row per match
+        score: Similarity per match
+        chunk: Chunk index of the best evidence per match
+        scope: Clause rows that were scored (all rows when None)
+    """
+
+    def __init__(self, store: RegulationStore, document_ids: np.ndarray, control_texts: List[str],
+                 doc: np.ndarray, clause: np.ndarray, score: np.ndarray, chunk: np.ndarray,
+                 scope: Optional[np.ndarray] = None):
+        self.store = store
+        self.document_ids = np.asarray(document_ids, dtype=np.int64)
+        self.control_texts = control_texts
+        self.doc = np.asarray(doc, dtype=np.int32)
+        self.clause = np.asarray(clause, dtype=np.int64)
+        self.score = np.asarray(score, dtype=np.float32)
+        self.chunk = np.asarray(chunk, dtype=np.int32)
+        self.scope = np.arange(len(store)) if scope is None else np.asarray(scope, dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.score)
+
+    @property
+    def n_documents(self) -> int:
+        return len(self.control_texts)
+
+    @property
+    def regulation(self) -> np.ndarray:
+        """Regulation position (into store.regulation_names) per match"""
+        return self.store.regulation_index[self.clause]
+
+    @classmethod
+    def from_arrays(cls, store: RegulationStore, documents: Sequence[Dict[str, Any]],
+                    scores: Sequence[np.ndarray], clauses: Sequence[np.ndarray], chunks: Sequence[np.ndarray],
+                    scope: Optional[np.ndarray] = None) -> 'MatchTable':
+        """Table from per-document score/clause/chunk arrays, as computed by MatchEngine"""
+        counts = [len(s) for s in scores]
+        empty_f, empty_i = np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int64)
+        return cls(
+            store,
+            np.array([doc.get("id") or -1 for doc in documents], dtype=np.int64),
+            [doc["text"] for doc in documents],
+            np.repeat(np.arange(len(documents), dtype=np.int32), counts),
+            np.concatenate(list(clauses) + [empty_i]),
+            np.concatenate(list(scores) + [empty_f]),
+            np.concatenate(list(chunks) + [empty_i]),
+            scope
+        )
+
+    @classmethod
+    def from_results(cls, results: List[Dict[str, Any]], regulations) -> 'MatchTable':
+        """Table from nested match_documents() results"""
+        store = as_store(regulations)
+        clauses, scores, chunks = [], [], []
+        for result in results:
+            rows = [store.row(match["clause_id"]) for match in result["matches"]]
+            keep = [i for i, row in enumerate(rows) if row is not None]
+            clauses.append(np.array([rows[i] for i in keep], dtype=np.int64))
+            scores.append(np.array([result["matches"][i]["similarity_score"] for i in keep], dtype=np.float32))
+            chunks.append(np.array([result["matches"][i].get("chunk_index", 0) for i in keep], dtype=np.int64))
+        documents = [{"id": result.get("document_id"), "text": result["control_text"]} for result in results]
+        return cls.from_arrays(store, documents, scores, clauses, chunks)
+
+    @classmethod
+    def concat(cls, tables: Sequence['MatchTable']) -> 'MatchTable':
+        """Stack tables scored against the same store (e.g. batches of one upload)"""
+        if not tables:
+            raise ValueError("No tables to concatenate")
+        offsets = np.cumsum([0] + [table.n_documents for table in tables])
+        return cls(
+            tables[0].store,
+            np.concatenate([table.document_ids for table in tables]),
+            [text for table in tables for text in table.control_texts],
+            np.concatenate([table.doc + offset for table, offset in zip(tables, offsets)]),
+            np.concatenate([table.clause for table in tables]),
+            np.concatenate([table.score for table in tables]),
+            np.concatenate([table.chunk for table in tables]),
+            np.unique(np.concatenate([table.scope for table in tables]))
+        )
+
+    def to_frame(self):
+        """pandas DataFrame with one row per match; names are categoricals over the store"""
+        import pandas as pd
+        store = self.store
+        regulation = self.regulation
+        return pd.DataFrame({
+            "document": self.doc,
+            "document_id": self.document_ids[self.doc],
+            "regulation": pd.Categorical.from_codes(regulation, store.regulation_names),
+            "clause": pd.Categorical.from_codes(self.clause, store.clause_ids)
+            if len(set(store.clause_ids)) == len(store.clause_ids)
+            else np.asarray(store.clause_ids, dtype=object)[self.clause],
+            "score": self.score,
+            "chunk_index": self.chunk
+        })
+
+    def to_results(self) -> List[Dict[str, Any]]:
+        """Nested results in the match_documents() format (without page/char offsets)"""
+        results = [{
+            "document_id": None if doc_id < 0 else int(doc_id),
+            "control_text": text,
+            "matches": []
+        } for doc_id, text in zip(self.document_ids, self.control_texts)]
+        for doc, row, score, chunk in zip(self.doc, self.clause, self.score, self.chunk):
+            regulation, clause_id, description = self.store.clause_metadata(row)
+            results[doc]["matches"].append({
+                "regulation": regulation,
+                "regulation_description": description,
+                "clause_id": clause_id,
+                "clause_text": self.store.texts[row],
+                "similarity_score": float(score),
+                "chunk_index": int(chunk)
+            })
+        return results
@@ -0,0 +1,177 @@
+# api/model_registry.py
+import os
+import re
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+MODEL_NAME = os.getenv('EMBEDDING_MODEL', 'sentence-transformers/all-MiniLM-L6-v2')
+# Optional directory of pre-downloaded models, so startup needs no network
+MODEL_DIR = os.getenv('MODEL_DIR')
+# CPU inference path (see api.encoders): torch, torch-int8, onnx or onnx-int8
+ENCODER_BACKEND = os.getenv('ENCODER_BACKEND', 'torch')
+ENCODER_THREADS = int(os.getenv('ENCODER_THREADS', '0')) or None
+# Named encoders as alias=model[@backend], separated by commas, e.g.
+# ENCODERS=fast=sentence-transformers/all-MiniLM-L6-v2,accurate=sentence-transformers/all-mpnet-base-v2@onnx
+ENCODERS_SPEC = os.getenv('ENCODERS', '')
+# Encoder MatchEngine uses by default, and the cheap one that shortlists for it (cascade)
+MATCH_ENCODER = os.getenv('MATCH_ENCODER', MODEL_NAME)
+CASCADE_ENCODER = os.getenv('CASCADE_ENCODER', '')
+CASCADE_CANDIDATES = int(os.getenv('CASCADE_CANDIDATES', '50'))
+# Text-generation model behind the compliance chatbot
+GENERATOR_NAME = os.getenv('CHATBOT_MODEL', 'gpt2')
+
+_models = {}
+_warming = {}
+_lock = threading.Lock()
+
+
+def resolve_model_path(model_name: str, model_dir: Optional[str] = MODEL_DIR) -> str:
+    """
+    Local path for a model if it exists under model_dir, else the hub name
+    Looks for <model_dir>/<org>_<name>, <model_dir>/<org>/<name> and <model_dir>/<name>
+    """
+    if model_dir:
+        candidates = [
+            re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name),
+            model_name,
+            model_name.split('/')[-1]
+        ]
+        for candidate in candidates:
+            path = os.path.join(model_dir, candidate)
+            if os.path.isdir(path):
+                return path
+    return model_name
+
+
+def parse_encoders(spec: str) -> Dict[str, Tuple[str, Optional[str]]]:
+    """alias -> (model name, backend or None) from an ENCODERS value"""
+    encoders = {}
+    for entry in spec.split(','):
+        if not entry.strip():
+            continue
+        if '=' not in entry:
+            raise ValueError(f"ENCODERS entries must look like alias=model[@backend]: {entry.strip()}")
+        alias, target = (part.strip() for part in entry.split('=', 1))
+        model_name, _, backend = target.partition('@')
+        encoders[alias] = (model_name, backend or None)
+    return encoders
+
+
+ENCODERS = parse_encoders(ENCODERS_SPEC)
+
+
+def resolve_encoder(name: str = MATCH_ENCODER, backend: Optional[str] = None) -> Tuple[str, str]:
+    """
+    (model name, backend) for an ENCODERS alias, a 'model@backend' string or a plain model name
+    An explicit backend wins over the alias's; ENCODER_BACKEND is the fallback.
+    """
+    if name in ENCODERS:
+        model_name, alias_backend = ENCODERS[name]
+        return model_name, backend or alias_backend or ENCODER_BACKEND
+    model_name, _, name_backend = name.partition('@')
+    return model_name, backend or name_backend or ENCODER_BACKEND
+
+
+def get_model(model_name: str = MODEL_NAME):
+    """Return the process-wide SentenceTransformer for model_name, loading it on first use"""
+    model = _models.get(model_name)
+    if model is not None:
+        return model
+
+    # Loading happens under the lock so concurrent callers (and warm-up) load once
+    with _lock:
+        if model_name not in _models:
+            from sentence_transformers import SentenceTransformer
+            _models[model_name] = SentenceTransformer(
+                resolve_model_path(model_name),
+                use_auth_token=os.getenv('HUGGINGFACEHUB_API_TOKEN')
+            )
+        return _models[model_name]
+
+
+def get_encoder(model_name: str = MODEL_NAME, backend: str = ENCODER_BACKEND,
+                threads: Optional[int] = ENCODER_THREADS):
+    """
+    Return the process-wide encoder for a model/backend pair, creating it on first use
+    'torch' is the shared SentenceTransformer from get_model(). threads applies
+    when the encoder is first created (torch threads are process-wide).
+    """
+    from api.encoders import create_encoder, encoder_key
+    if backend == 'torch':
+        if threads:
+            import torch
+            torch.set_num_threads(threads)
+        return get_model(model_name)
+
+    key = encoder_key(model_name, backend)
+    encoder = _models.get(key)
+    if encoder is not None:
+        return encoder
+    with _lock:
+        if key not in _models:
+            _models[key] = create_encoder(model_name, backend, threads=threads)
+        return _models[key]
+
+
+def get_generator(model_name: str = GENERATOR_NAME):
+    """Return the process-wide transformers text-generation pipeline for model_name"""
+    key = f"generator:{model_name}"
+    generator = _models.get(key)
+    if generator is not None:
+        return generator
+    with _lock:
+        if key not in _models:
+            from transformers import pipeline
+            _models[key] = pipeline(
+                "text-generation",
+                model=resolve_model_path(model_name),
+                use_auth_token=os.getenv('HUGGINGFACEHUB_API_TOKEN')
+            )
+        return _models[key]
+
+
+def warm_up(encoder_names: Iterable[str] = (MATCH_ENCODER, CASCADE_ENCODER),
+            background: bool = True) -> Optional[threading.Thread]:
+    """
+    Preload encoders at startup; safe to call on every Streamlit rerun
+    Names are resolved like MatchEngine's (aliases, 'model@backend'); empty names are skipped.
+    Returns:
+        The loader thread when background=True and a load was started, else None
+    """
+    from api.encoders import encoder_key
+    encoders = {}
+    for name in encoder_names:
+        if name:
+            model_name, backend = resolve_encoder(name)
+            encoders.setdefault(encoder_key(model_name, backend), (model_name, backend))
+    pending = [key for key in encoders if key not in _models and key not in _warming]
+    if not pending:
+        return None
+
+    def load():
+        for key in pending:
+            try:
+                get_encoder(*encoders[key])
+            except Exception as e:
+                print(f"Warning: failed to warm up encoder {key}: {str(e)}")
+            finally:
+                _warming.pop(key, None)
+
+    for key in pending:
+        _warming[key] = True
+    if not background:
+        load()
+        return None
+
+    thread = threading.Thread(target=load, name='model-warm-up', daemon=True)
+    thread.start()
+    return thread
+
+
+def loaded_models() -> list:
+    """Names of models already resident in this process"""
+    return list(_models)
@@ -0,0 +1,135 @@
+# api/quantization.py
+"""
+Compressed storage for embedding matrices: float16 or per-row scalar int8
+
+float16 halves memory and needs no extra data. int8 stores each row as
+round(x / scale) with scale = max|x| / 127 kept in a float32 side array,
+a quarter of the float32 size. Both are scored a tile at a time: slicing
+returns float32 rows, so top_k_scores and aggregate_chunk_scores work on
+them unchanged while the full matrix stays compressed (and memory-mapped).
+"""
+import os
+import uuid
+from typing import Optional, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+STORAGE_DTYPES = ('float32', 'float16', 'int8')
+EMBEDDING_STORAGE = os.getenv('EMBEDDING_STORAGE', 'float32')
+# Shortlist size multiplier for the exact float32 re-rank of compressed scores (0 disables it)
+EMBEDDING_RERANK = int(os.getenv('EMBEDDING_RERANK', '4'))
+
+_BLOCK_ROWS = 65536
+
+
+def quantize_rows(matrix: np.ndarray, storage: str) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """Compress rows to storage dtype; returns (data, per-row scales or None)"""
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if storage == 'float32':
+        return matrix, None
+    if storage == 'float16':
+        return matrix.astype(np.float16), None
+    if storage == 'int8':
+        scales = np.abs(matrix).max(axis=1) / 127.0 if matrix.size else np.zeros(len(matrix), dtype=np.float32)
+        scales = scales.astype(np.float32)
+        safe = np.where(scales > 0, scales, 1.0)[:, None]
+        return np.clip(np.rint(matrix / safe), -127, 127).astype(np.int8), scales
+    raise ValueError(f"Unknown embedding storage: {storage}")
+
+
+def dequantize_rows(data: np.ndarray, scales: Optional[np.ndarray]) -> np.ndarray:
+    """float32 rows from compressed data"""
+    rows = np.asarray(data, dtype=np.float32)
+    if scales is None:
+        return rows
+    scales = np.asarray(scales, dtype=np.float32)
+    return rows * (scales[..., None] if rows.ndim > 1 else scales)
+
+
+class Int8Matrix:
+    """
+    int8 rows with per-row scales that index like a float32 matrix
+    matrix[rows] returns dequantized float32 rows; only those rows are expanded.
+    """
+
+    def __init__(self, data: np.ndarray, scales: np.ndarray):
+        self.data = data
+        self.scales = scales
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        return self.data.shape
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.data.dtype
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes + self.scales.nbytes
+
+    def __len__(self) -> int:
+        return self.data.shape[0]
+
+    def __getitem__(self, key) -> np.ndarray:
+        return dequantize_rows(self.data[key], self.scales[key])
+
+    def __array__(self, dtype=None):
+        rows = dequantize_rows(self.data, self.scales)
+        return rows if dtype is None else rows.astype(dtype, copy=False)
+
+
+def take_rows(matrix, rows: np.ndarray):
+    """Subset of rows that stays compressed (float32 rows are copied as float32)"""
+    if isinstance(matrix, Int8Matrix):
+        return Int8Matrix(np.asarray(matrix.data[rows]), np.asarray(matrix.scales[rows]))
+    return np.asarray(matrix[rows])
+
+
+def write_compressed(exact: np.ndarray, storage: str, data_path: str, scales_path: Optional[str] = None) -> None:
+    """
+    Write a compressed copy of a float32 matrix, block by block so a
+    memory-mapped source is never expanded whole; files appear atomically
+    """
+    # Unique per call: another thread may be writing (or have mapped) the same index
+    suffix = f".{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    n_rows, dim = exact.shape
+    data = np.lib.format.open_memmap(
+        data_path + suffix, mode='w+', dtype=np.dtype(storage), shape=(n_rows, dim)
+    ) if n_rows and dim else np.zeros((n_rows, dim), dtype=np.dtype(storage))
+    scales = np.zeros(n_rows, dtype=np.float32) if storage == 'int8' else None
+    for start in range(0, n_rows if dim else 0, _BLOCK_ROWS):
+        block, block_scales = quantize_rows(exact[start:start + _BLOCK_ROWS], storage)
+        data[start:start + len(block)] = block
+        if scales is not None:
+            scales[start:start + len(block)] = block_scales
+    if isinstance(data, np.memmap):
+        data.flush()
+        del data
+    else:
+        with open(data_path + suffix, 'wb') as f:
+            np.save(f, data)
+    if scales is not None:
+        with open(scales_path + suffix, 'wb') as f:
+            np.save(f, scales)
+        os.replace(scales_path + suffix, scales_path)
+    os.replace(data_path + suffix, data_path)
+
+
+def _load(path: str) -> np.ndarray:
+    try:
+        return np.load(path, mmap_mode='r')
+    except ValueError:
+        # Empty arrays cannot be memory-mapped
+        return np.load(path)
+
+
+def load_compressed(storage: str, data_path: str, scales_path: Optional[str] = None):
+    """Memory-map a matrix written by write_compressed (Int8Matrix for int8)"""
+    data = _load(data_path)
+    if storage == 'int8':
+        return Int8Matrix(data, _load(scales_path))
+    return data
@@ -1,28 +1,30 @@
 # api/regulation_loader.py
 import json
 import os
+import threading
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
+from api.embedding_index import text_sha256
+from api.regulation_store import RegulationStore, validate_regulations
 
 # Load environment variables
 load_dotenv()
 
+# Branch -> regulation names/jurisdictions, e.g. {"Mumbai": ["DPDP"], "Sydney": ["APRA"], "*": ["EU"]}
+BRANCH_SCOPES_PATH = os.getenv('BRANCH_SCOPES_PATH', 'data/branch_scopes.json')
+
+# Compiled stores per path: (mtime_ns, size), content hash, store
+_compiled: Dict[str, tuple] = {}
+_compiled_lock = threading.Lock()
+
 class RegulationLoader:
     def __init__(self):
         self.regulations_path = os.getenv('REGULATIONS_PATH', 'data/regulations.json')
 
     def _validate_structure(self, regulations: Dict[str, Any]) -> None:
         """Validate regulation structure matches expected format"""
-        required_keys = ['description', 'clauses']
-        for reg_name, reg_data in regulations.items():
-            if not all(key in reg_data for key in required_keys):
-                raise ValueError(f"Regulation {reg_name} missing required fields")
-            if not isinstance(reg_data['clauses'], dict):
-                raise ValueError(f"Clauses for {reg_name} must be key-value pairs")
-            for clause_id in reg_data['clauses']:
-                if '_' not in clause_id:
-                    raise ValueError(f"Clause ID {clause_id} must contain underscore (e.g., GDPR_1)")
+        validate_regulations(regulations)
 
     def _create_sample_file(self) -> None:
         """Generate sample regulations file"""
@@ -47,6 +49,45 @@ class RegulationLoader:
         with open(self.regulations_path, 'w') as f:
             json.dump(sample, f, indent=2)
 
+    def load_store(self) -> RegulationStore:
+        """
+        Compiled regulations, parsed and validated only when the file changes
+        A stat() per call detects edits; a changed mtime with identical bytes
+        (e.g. a touch or re-checkout) keeps the compiled store.
+        """
+        # Create sample if missing
+        if not os.path.exists(self.regulations_path):
+            self._create_sample_file()
+
+        stat = os.stat(self.regulations_path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        cached = _compiled.get(self.regulations_path)
+        if cached is not None and cached[0] == stat_key:
+            return cached[2]
+
+        with _compiled_lock:
+            cached = _compiled.get(self.regulations_path)
+            if cached is not None and cached[0] == stat_key:
+                return cached[2]
+
+            with open(self.regulations_path, 'rb') as f:
+                raw = f.read()
+            content_hash = text_sha256(raw.decode('utf-8'))
+            if cached is not None and cached[1] == content_hash:
+                _compiled[self.regulations_path] = (stat_key, content_hash, cached[2])
+                return cached[2]
+
+            # Check file age
+            file_age = datetime.now() - datetime.fromtimestamp(stat.st_mtime)
+            if file_age.days > 30:
+                print(f"Warning: Regulations file is {file_age.days} days old")
+
+            data = json.loads(raw)
+            self._validate_structure(data)
+            store = RegulationStore.compile(data, validate=False)
+            _compiled[self.regulations_path] = (stat_key, content_hash, store)
+            return store
+
     def load(self) -> Dict[str, Any]:
         """
         Load and validate regulations
@@ -61,27 +102,59 @@ class RegulationLoader:
                 },
                 ...
             }
+            The dict is shared with the compiled store; treat it as read-only.
         """
-        # Create sample if missing
-        if not os.path.exists(self.regulations_path):
-            self._create_sample_file()
-
-        # Check file age
-        if os.path.exists(self.regulations_path):
-            file_age = (datetime.now() - 
-                       datetime.fromtimestamp(os.path.getmtime(self.regulations_path)))
-            if file_age.days > 30:
-                print(f"Warning: Regulations file is {file_age.days} days old")
-
-        # Load and validate
         try:
-            with open(self.regulations_path, 'r') as f:
-                data = json.load(f)
-            self._validate_structure(data)
-            return data
+            return self.load_store().regulations
         except Exception as e:
             print(f"Error loading regulations: {str(e)}")
             return {}
 
+def cached_store(regulations: Dict[str, Any]) -> Optional[RegulationStore]:
+    """The compiled store a dict returned by load() belongs to, if any"""
+    for _, _, store in list(_compiled.values()):
+        if store.regulations is regulations:
+            return store
+    return None
+
+_branch_scopes: Dict[str, tuple] = {}
+
+def load_branch_scopes(path: str = BRANCH_SCOPES_PATH) -> Dict[str, List[str]]:
+    """Branch -> scope mapping, re-read only when the file changes ({} if there is none)"""
+    if not os.path.exists(path):
+        return {}
+    mtime = os.stat(path).st_mtime_ns
+    cached = _branch_scopes.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    with open(path, 'r') as f:
+        mapping = json.load(f)
+    if not isinstance(mapping, dict) or not all(isinstance(v, list) for v in mapping.values()):
+        raise ValueError(f"{path} must map branch names to lists of regulations or jurisdictions")
+    _branch_scopes[path] = (mtime, mapping)
+    return mapping
+
+def branch_scope(branch: Optional[str], path: str = BRANCH_SCOPES_PATH) -> Optional[List[str]]:
+    """
+    Scope entries for a branch: its own entry, else the '*' entry, else None (all regulations)
+    Branch names are compared case-insensitively.
+    """
+    mapping = load_branch_scopes(path)
+    if branch is not None:
+        if branch in mapping:
+            return mapping[branch]
+        for name, scope in mapping.items():
+            if name.casefold() == branch.casefold():
+                return scope
+    return mapping.get('*')
+
 # Singleton instance for easy import
-regulation_loader = RegulationLoader()
\ No newline at end of file
+regulation_loader = RegulationLoader()
+
+def load_regulations() -> Dict[str, Any]:
+    """Regulations dict from the default loader"""
+    return regulation_loader.load()
+
+def load_regulation_store() -> RegulationStore:
+    """Compiled regulation store from the default loader"""
+    return regulation_loader.load_store()
\ No newline at end of file
@@ -0,0 +1,179 @@
+# api/regulation_store.py
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from api.embedding_index import regulations_fingerprint, text_sha256
+
+
+# Trailing parenthesised region in a description, e.g. "... Act (India)"
+_JURISDICTION_PATTERN = re.compile(r'\(([^()]+)\)\s*$')
+
+
+def regulation_jurisdiction(reg_data: Dict[str, Any]) -> Optional[str]:
+    """Explicit 'jurisdiction' field of a regulation, else the region named in its description"""
+    if reg_data.get('jurisdiction'):
+        return str(reg_data['jurisdiction'])
+    match = _JURISDICTION_PATTERN.search(reg_data.get('description', ''))
+    return match.group(1).strip() if match else None
+
+
+def validate_regulations(regulations: Dict[str, Any]) -> None:
+    """Validate regulation structure matches expected format"""
+    required_keys = ['description', 'clauses']
+    for reg_name, reg_data in regulations.items():
+        if not all(key in reg_data for key in required_keys):
+            raise ValueError(f"Regulation {reg_name} missing required fields")
+        if not isinstance(reg_data['clauses'], dict):
+            raise ValueError(f"Clauses for {reg_name} must be key-value pairs")
+        for clause_id in reg_data['clauses']:
+            if '_' not in clause_id:
+                raise ValueError(f"Clause ID {clause_id} must contain underscore (e.g., GDPR_1)")
+
+
+class RegulationStore:
+    """
+    Column-oriented, read-only view of a regulations dict
+
+    Clauses are flattened once into parallel columns (clause_ids, texts,
+    text_hashes, regulation_index) with the clauses of each regulation in
+    contiguous rows, plus a description table per regulation. Lookups by
+    clause id are O(1) and filtering by regulation is a row slice, so
+    matching never walks the nested dict again. Build one with compile()
+    or load it through RegulationLoader.load_store(), which caches it.
+    """
+
+    def __init__(self, regulations: Dict[str, Any], regulation_names: List[str], descriptions: List[str],
+                 regulation_index: np.ndarray, clause_ids: List[str], texts: List[str],
+                 text_hashes: List[str], versions: Dict[str, str], fingerprint: str):
+        self.regulations = regulations
+        self.regulation_names = regulation_names
+        self.descriptions = descriptions
+        self.jurisdictions = [regulation_jurisdiction(regulations[name]) for name in regulation_names]
+        self.regulation_index = regulation_index
+        self.clause_ids = clause_ids
+        self.texts = texts
+        self.text_hashes = text_hashes
+        # Content hash per regulation (incremental matching) and of the whole library
+        self.versions = versions
+        self.fingerprint = fingerprint
+
+        # Clauses of one regulation are contiguous rows: name -> (start, end)
+        self.regulation_slices: Dict[str, Tuple[int, int]] = {}
+        bounds = np.searchsorted(regulation_index, np.arange(len(regulation_names) + 1))
+        for position, name in enumerate(regulation_names):
+            self.regulation_slices[name] = (int(bounds[position]), int(bounds[position + 1]))
+        self._rows: Dict[str, int] = {}
+        for row, clause_id in enumerate(clause_ids):
+            self._rows.setdefault(clause_id, row)
+
+    @classmethod
+    def compile(cls, regulations: Dict[str, Any], validate: bool = True) -> 'RegulationStore':
+        """Flatten and hash a regulations dict once"""
+        if validate:
+            validate_regulations(regulations)
+        regulation_names = list(regulations)
+        descriptions = []
+        counts = []
+        clause_ids = []
+        texts = []
+        versions = {}
+        for reg_name in regulation_names:
+            reg_data = regulations[reg_name]
+            descriptions.append(reg_data['description'])
+            counts.append(len(reg_data['clauses']))
+            for clause_id, clause_text in reg_data['clauses'].items():
+                clause_ids.append(clause_id)
+                texts.append(clause_text)
+            versions[reg_name] = regulations_fingerprint({reg_name: reg_data})
+        regulation_index = np.repeat(np.arange(len(regulation_names), dtype=np.int32), counts)
+        return cls(
+            regulations, regulation_names, descriptions, regulation_index, clause_ids, texts,
+            [text_sha256(text) for text in texts], versions, regulations_fingerprint(regulations)
+        )
+
+    def __len__(self) -> int:
+        return len(self.clause_ids)
+
+    def __contains__(self, clause_id: str) -> bool:
+        return clause_id in self._rows
+
+    def row(self, clause_id: str) -> Optional[int]:
+        """Row of a clause id, or None"""
+        return self._rows.get(clause_id)
+
+    def clause_metadata(self, row: int) -> Tuple[str, str, str]:
+        """(regulation, clause_id, regulation description) of a row"""
+        position = self.regulation_index[row]
+        return self.regulation_names[position], self.clause_ids[row], self.descriptions[position]
+
+    def clause(self, clause_id: str) -> Optional[Dict[str, str]]:
+        """Regulation, description and text of a clause id, or None"""
+        row = self._rows.get(clause_id)
+        if row is None:
+            return None
+        regulation, _, description = self.clause_metadata(row)
+        return {
+            'regulation': regulation,
+            'regulation_description': description,
+            'clause_id': clause_id,
+            'clause_text': self.texts[row]
+        }
+
+    def resolve_scope(self, scope: Optional[Iterable[str]]) -> List[str]:
+        """
+        Regulation names selected by scope entries, in store order
+        Entries are regulation names or jurisdictions, compared case-insensitively;
+        None selects every regulation.
+        """
+        if scope is None:
+            return list(self.regulation_names)
+        wanted = {str(entry).casefold() for entry in scope}
+        return [
+            name for name, jurisdiction in zip(self.regulation_names, self.jurisdictions)
+            if name.casefold() in wanted or (jurisdiction and jurisdiction.casefold() in wanted)
+        ]
+
+    def rows(self, names: Optional[Iterable[str]] = None) -> np.ndarray:
+        """Rows of the named regulations (all rows when names is None), in the order given"""
+        if names is None:
+            return np.arange(len(self.clause_ids))
+        segments = [np.arange(*self.regulation_slices[name]) for name in names if name in self.regulation_slices]
+        return np.concatenate(segments + [np.empty(0, dtype=np.int64)]).astype(np.int64)
+
+    def select(self, names: Iterable[str]) -> 'RegulationStore':
+        """Store restricted to the named regulations, sliced from the columns without re-flattening"""
+        names = [name for name in names if name in self.regulation_slices]
+        if names == self.regulation_names:
+            return self
+        rows = self.rows(names)
+        positions = [self.regulation_names.index(name) for name in names]
+        remap = np.full(len(self.regulation_names), -1, dtype=np.int32)
+        remap[positions] = np.arange(len(positions), dtype=np.int32)
+        regulations = {name: self.regulations[name] for name in names}
+        return RegulationStore(
+            regulations,
+            names,
+            [self.descriptions[position] for position in positions],
+            remap[self.regulation_index[rows]],
+            [self.clause_ids[row] for row in rows],
+            [self.texts[row] for row in rows],
+            [self.text_hashes[row] for row in rows],
+            {name: self.versions[name] for name in names},
+            regulations_fingerprint(regulations)
+        )
+
+
+def as_store(regulations: Any) -> RegulationStore:
+    """
+    Compiled store for a RegulationStore or regulations dict
+    Dicts returned by RegulationLoader.load() map back to their cached store,
+    so only ad-hoc dicts are flattened again. Treat those dicts as read-only.
+    """
+    if isinstance(regulations, RegulationStore):
+        return regulations
+    # Deferred: the loader imports this module
+    from api.regulation_loader import cached_store
+    store = cached_store(regulations)
+    if store is not None:
+        return store
+    return RegulationStore.compile(regulations, validate=False)
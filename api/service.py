@@ -0,0 +1,245 @@
+# api/service.py
+"""
+Local HTTP matching service with request micro-batching
+
+    python -m api.service --host 127.0.0.1 --port 8080
+
+POST /match    {"control_texts": ["..."], "top_k": 5}  -> {"results": [...]}
+GET  /metrics  queue depth and batch-size statistics
+GET  /health   liveness check
+
+Concurrent requests are queued and merged into one MatchEngine call per
+distinct top_k (one encode() over all their texts) once max_batch_size texts
+are waiting or max_wait_ms has passed since the first one arrived. Requests
+are not merged across top_k, since top_k sizes the compressed-storage re-rank
+shortlist and a request's results must not depend on its batch mates.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from typing import Any, Dict, List, Tuple
+from dotenv import load_dotenv
+from api.match_engine import MatchEngine
+from api.regulation_loader import RegulationLoader
+
+# Load environment variables
+load_dotenv()
+
+MAX_BATCH_SIZE = int(os.getenv('SERVICE_MAX_BATCH_SIZE', '64'))
+MAX_WAIT_MS = float(os.getenv('SERVICE_MAX_WAIT_MS', '10'))
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error'}
+
+
+class MicroBatcher:
+    """Collects queued match requests and scores them together in a worker thread"""
+
+    def __init__(self, engine: MatchEngine, regulations: Dict[str, Any],
+                 max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        self.engine = engine
+        self.regulations = regulations
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.pending_texts = 0
+        self.metrics = {
+            'requests_total': 0,
+            'batches_total': 0,
+            'texts_total': 0,
+            'batch_size_max': 0,
+            'batch_size_last': 0,
+            'batch_seconds_total': 0.0,
+            'errors_total': 0
+        }
+
+    async def submit(self, texts: List[str], top_k: int) -> List[Dict[str, Any]]:
+        """Queue texts for matching and wait for their results"""
+        future = asyncio.get_running_loop().create_future()
+        self.pending_texts += len(texts)
+        self.metrics['requests_total'] += 1
+        await self.queue.put((texts, top_k, future))
+        return await future
+
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0][0])
+            deadline = loop.time() + self.max_wait
+            while size < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                batch.append(item)
+                size += len(item[0])
+
+            self.pending_texts -= size
+            await self._score(batch, size)
+
+    async def _score(self, batch: List[Tuple[List[str], int, asyncio.Future]], size: int) -> None:
+        # Blank texts are dropped by the engine, so only non-empty ones are sent
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[1], []).extend(text for text in item[0] if text.strip())
+        start = time.perf_counter()
+        try:
+            grouped = await asyncio.get_running_loop().run_in_executor(None, self._match_groups, groups)
+        except Exception as e:
+            self.metrics['errors_total'] += 1
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.metrics['batches_total'] += 1
+        self.metrics['texts_total'] += size
+        self.metrics['batch_size_last'] = size
+        self.metrics['batch_size_max'] = max(self.metrics['batch_size_max'], size)
+        self.metrics['batch_seconds_total'] += time.perf_counter() - start
+
+        scored = {top_k: iter(results) for top_k, results in grouped.items()}
+        for item_texts, item_top_k, future in batch:
+            item_results = []
+            for text in item_texts:
+                if text.strip():
+                    item_results.append(next(scored[item_top_k]))
+                else:
+                    item_results.append({'document_id': None, 'control_text': text, 'matches': []})
+            if not future.done():
+                future.set_result(item_results)
+
+    def _match_groups(self, groups: Dict[int, List[str]]) -> Dict[int, List[Dict[str, Any]]]:
+        """Results per top_k, in the order of that group's texts"""
+        return {
+            top_k: self.engine.match_controls_to_regulations(texts, self.regulations, top_k) if texts else []
+            for top_k, texts in groups.items()
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        batches = self.metrics['batches_total']
+        return {
+            **self.metrics,
+            'queue_depth': self.queue.qsize(),
+            'queued_texts': self.pending_texts,
+            'batch_size_mean': self.metrics['texts_total'] / batches if batches else 0.0,
+            'max_batch_size': self.max_batch_size,
+            'max_wait_ms': self.max_wait * 1000.0
+        }
+
+
+class MatchService:
+    """Minimal HTTP/1.1 front end over asyncio streams (one request per connection)"""
+
+    def __init__(self, batcher: MicroBatcher):
+        self.batcher = batcher
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            status, payload = await self._dispatch(reader)
+        except Exception as e:
+            status, payload = 500, {'error': str(e)}
+
+        body = json.dumps(payload).encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n".encode('ascii') + body
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, reader: asyncio.StreamReader) -> Tuple[int, Any]:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        if len(request_line) < 2:
+            return 400, {'error': 'Malformed request line'}
+        method, path = request_line[0].upper(), request_line[1].split('?')[0]
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if path == '/health':
+            return 200, {'status': 'ok'}
+        if path == '/metrics':
+            return 200, self.batcher.snapshot()
+        if path != '/match':
+            return 404, {'error': f'Unknown path: {path}'}
+        if method != 'POST':
+            return 405, {'error': 'Use POST for /match'}
+
+        try:
+            length = int(headers.get('content-length', '0'))
+        except ValueError:
+            length = -1
+        if length < 0:
+            return 400, {'error': 'Invalid Content-Length'}
+        if length > MAX_BODY_BYTES:
+            return 413, {'error': 'Request body too large'}
+        try:
+            request = json.loads(await reader.readexactly(length) or b'{}')
+        except asyncio.IncompleteReadError:
+            return 400, {'error': 'Body shorter than Content-Length'}
+        except ValueError:
+            return 400, {'error': 'Body must be JSON'}
+        if not isinstance(request, dict):
+            return 400, {'error': 'Body must be a JSON object'}
+
+        texts = request.get('control_texts')
+        if texts is None and 'text' in request:
+            texts = [request['text']]
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            return 400, {'error': "Provide 'control_texts' as a list of strings"}
+        # Requests share one batch, so a bad value must not reach the engine
+        top_k = request.get('top_k', 5)
+        if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k < 1:
+            return 400, {'error': "'top_k' must be a positive integer"}
+
+        results = await self.batcher.submit(texts, top_k)
+        return 200, {'results': results}
+
+
+async def serve(host: str, port: int, max_batch_size: int, max_wait_ms: float) -> None:
+    regulations = RegulationLoader().load()
+    if not regulations:
+        raise ValueError("No regulations loaded")
+    engine = MatchEngine()
+    batcher = MicroBatcher(engine, regulations, max_batch_size, max_wait_ms)
+    service = MatchService(batcher)
+
+    worker = asyncio.create_task(batcher.run())
+    server = await asyncio.start_server(service.handle, host, port)
+    print(f"Matching service listening on http://{host}:{port}")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        worker.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local compliance matching service")
+    parser.add_argument('--host', default=os.getenv('SERVICE_HOST', '127.0.0.1'))
+    parser.add_argument('--port', type=int, default=int(os.getenv('SERVICE_PORT', '8080')))
+    parser.add_argument('--max-batch-size', type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument('--max-wait-ms', type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+    asyncio.run(serve(args.host, args.port, args.max_batch_size, args.max_wait_ms))
+
+
+if __name__ == '__main__':
+    main()
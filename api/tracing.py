@@ -0,0 +1,297 @@
+# api/tracing.py
+"""
+Lightweight per-stage tracing for the ingestion and matching pipeline
+
+Stages: file_write, text_extraction, db_insert, control_encoding,
+clause_encoding, similarity, top_k, result_save. Each span records wall
+time, item count and batch size to the configured sink:
+
+    TRACE_SINK=memory                   aggregate in process (see summary())
+    TRACE_SINK=jsonl:data/trace.jsonl   one JSON line per span
+    TRACE_SINK=prometheus:data/trace.prom
+                                        Prometheus text format, rewritten on flush()
+
+TRACE_PROFILE=cprofile:<path> or sample:<path> profiles a single run via
+profile_from_env() (see profile()).
+
+With no sink configured span() returns a shared no-op context manager, so
+instrumented code pays one global lookup per call.
+
+Worker processes (parse_controls with workers > 1) read TRACE_SINK on import
+too; only the JSONL sink collects their spans in the same place.
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Iterator, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+STAGES = (
+    'file_write',
+    'text_extraction',
+    'db_insert',
+    'control_encoding',
+    'clause_encoding',
+    'similarity',
+    'top_k',
+    'result_save'
+)
+
+
+class MemorySink:
+    """Aggregates calls, seconds, items and batch sizes per stage"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, stage: str, seconds: float, items: int, batch_size: Optional[int]) -> None:
+        with self._lock:
+            stats = self.stats.get(stage)
+            if stats is None:
+                stats = self.stats[stage] = {
+                    'calls': 0, 'seconds': 0.0, 'items': 0, 'max_seconds': 0.0, 'max_batch_size': 0
+                }
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['items'] += items
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            if batch_size:
+                stats['max_batch_size'] = max(stats['max_batch_size'], batch_size)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {stage: dict(stats) for stage, stats in self.stats.items()}
+
+    def flush(self) -> None:
+        pass
+
+
+class JsonlSink(MemorySink):
+    """Appends every span as a JSON line (one file may be shared by several processes)"""
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    def record(self, stage: str, seconds: float, items: int, batch_size: Optional[int]) -> None:
+        super().record(stage, seconds, items, batch_size)
+        line = json.dumps({
+            'ts': time.time(),
+            'pid': os.getpid(),
+            'stage': stage,
+            'seconds': round(seconds, 6),
+            'items': items,
+            'batch_size': batch_size
+        })
+        # Single appends of a short line do not interleave between processes
+        with self._lock, open(self.path, 'a') as f:
+            f.write(line + '\n')
+
+
+class PrometheusSink(MemorySink):
+    """Writes the aggregated stage counters in Prometheus text exposition format"""
+
+    def __init__(self, path: str, prefix: str = 'checkmate'):
+        super().__init__()
+        self.path = path
+        self.prefix = prefix
+
+    def render(self) -> str:
+        metrics = (
+            ('stage_calls_total', 'counter', 'calls', 'Spans recorded per pipeline stage'),
+            ('stage_seconds_total', 'counter', 'seconds', 'Wall time spent per pipeline stage'),
+            ('stage_items_total', 'counter', 'items', 'Items processed per pipeline stage'),
+            ('stage_seconds_max', 'gauge', 'max_seconds', 'Slowest single span per pipeline stage'),
+            ('stage_batch_size_max', 'gauge', 'max_batch_size', 'Largest batch per pipeline stage')
+        )
+        summary = self.summary()
+        lines = []
+        for name, kind, key, help_text in metrics:
+            lines.append(f"# HELP {self.prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {self.prefix}_{name} {kind}")
+            for stage, stats in sorted(summary.items()):
+                lines.append(f'{self.prefix}_{name}{{stage="{stage}"}} {stats[key]}')
+        return '\n'.join(lines) + '\n'
+
+    def flush(self) -> None:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(self.render())
+        os.replace(tmp_path, self.path)
+
+
+def create_sink(spec: Optional[str]) -> Optional[MemorySink]:
+    """Sink for a TRACE_SINK value: 'memory', 'jsonl:<path>' or 'prometheus:<path>'; empty disables"""
+    if not spec:
+        return None
+    kind, _, path = spec.partition(':')
+    if kind == 'memory':
+        return MemorySink()
+    if kind == 'jsonl':
+        return JsonlSink(path or 'data/trace.jsonl')
+    if kind == 'prometheus':
+        return PrometheusSink(path or 'data/trace.prom')
+    raise ValueError(f"Unknown TRACE_SINK: {spec}")
+
+
+_sink: Optional[MemorySink] = create_sink(os.getenv('TRACE_SINK'))
+
+
+def configure(sink: Optional[MemorySink]) -> Optional[MemorySink]:
+    """Install a sink (None disables tracing) and return the previous one"""
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
+
+
+def enabled() -> bool:
+    return _sink is not None
+
+
+def get_sink() -> Optional[MemorySink]:
+    return _sink
+
+
+def record(stage: str, seconds: float, items: int = 0, batch_size: Optional[int] = None) -> None:
+    """Record an already measured duration, e.g. time accumulated over the tiles of a loop"""
+    sink = _sink
+    if sink is not None:
+        sink.record(stage, seconds, items, batch_size)
+
+
+class _Span:
+    __slots__ = ('sink', 'stage', 'items', 'batch_size', 'start')
+
+    def __init__(self, sink, stage, items, batch_size):
+        self.sink = sink
+        self.stage = stage
+        self.items = items
+        self.batch_size = batch_size
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.sink.record(self.stage, time.perf_counter() - self.start, self.items, self.batch_size)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+    items = 0
+    batch_size = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        # Lets callers set span.items after the fact without checking whether tracing is on
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage: str, items: int = 0, batch_size: Optional[int] = None):
+    """
+    Time a block as one span of stage
+        with tracing.span('db_insert', items=len(records)) as s:
+            ...
+    s.items may be updated inside the block when the count is only known at the end.
+    """
+    sink = _sink
+    if sink is None:
+        return _NULL_SPAN
+    return _Span(sink, stage, items, batch_size)
+
+
+def summary() -> Dict[str, Dict[str, float]]:
+    """Per-stage totals from the current sink ({} when tracing is disabled)"""
+    return _sink.summary() if _sink is not None else {}
+
+
+def flush() -> None:
+    if _sink is not None:
+        _sink.flush()
+
+
+class _Sampler(threading.Thread):
+    """Samples every thread's stack at a fixed interval and counts collapsed stacks"""
+
+    def __init__(self, interval: float):
+        super().__init__(daemon=True)
+        self.interval = interval
+        self.counts: Dict[str, int] = {}
+        self._stop_event = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+
+@contextmanager
+def profile(path: str, mode: str = 'cprofile', interval: float = 0.005) -> Iterator[Any]:
+    """
+    Profile one run of a block (opt-in, not for production traffic)
+    mode='cprofile' writes pstats data to path (view with `python -m pstats` or snakeviz);
+    mode='sample' samples stacks every interval seconds and writes collapsed
+    stacks ("frame;frame;frame count" lines) that flamegraph tools read directly.
+    """
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+    elif mode == 'sample':
+        sampler = _Sampler(interval)
+        sampler.start()
+        try:
+            yield sampler
+        finally:
+            sampler.stop()
+            with open(path, 'w') as f:
+                for stack, count in sorted(sampler.counts.items(), key=lambda item: -item[1]):
+                    f.write(f"{stack} {count}\n")
+    else:
+        raise ValueError(f"Unknown profile mode: {mode}")
+
+
+def profile_from_env(spec: Optional[str] = None):
+    """profile() configured by TRACE_PROFILE ('cprofile:<path>' or 'sample:<path>'), else a no-op"""
+    spec = spec if spec is not None else os.getenv('TRACE_PROFILE')
+    if not spec:
+        return nullcontext()
+    mode, _, path = spec.partition(':')
+    return profile(path or f"data/profile.{'prof' if mode == 'cprofile' else 'folded'}", mode=mode)
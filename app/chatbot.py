@@ -1,14 +1,14 @@
 # app/chatbot.py
 import streamlit as st
-from transformers import pipeline
+from api.assistant import get_assistant
 from api.regulation_loader import load_regulations
 
 def show_chatbot():
     st.title("Compliance Assistant Chatbot")
     
-    # Load regulations and initialize chatbot
+    # Load regulations; the assistant (and its generator) is shared across reruns
     regulations = load_regulations()
-    chatbot = pipeline("text-generation", model="gpt2")
+    assistant = get_assistant()
     
     # Initialize chat history
     if "messages" not in st.session_state:
@@ -28,15 +28,8 @@ def show_chatbot():
         with st.chat_message("user"):
             st.markdown(prompt)
         
-        # Generate response
-        context = f"""
-        You are a compliance expert helping a multinational bank. Here are relevant regulations:
-        {regulations}
-        """
-        full_prompt = f"{context}\n\nQuestion: {prompt}\n\nAnswer:"
-        
-        response = chatbot(full_prompt, max_length=200, do_sample=True)[0]['generated_text']
-        response = response.split("Answer:")[-1].strip()
+        # Generate response from the clauses most relevant to the question
+        response = assistant.answer(prompt, regulations)
         
         # Display assistant response in chat message container
         with st.chat_message("assistant"):
@@ -1,32 +1,130 @@
 # app/dashboard.py
+import os
+import time
 import streamlit as st
-from api.document_parser import parse_controls
+from api.document_parser import hash_uploads, parse_controls
+from api.jobs import get_registry
 from api.regulation_loader import load_regulations
+from api.regulation_store import as_store
 from api.match_engine import MatchEngine
+from api.match_table import MatchTable
+from api.model_registry import warm_up
 from utils.visualize import display_compliance_summary, display_gap_analysis
 
+# Uploads with at least this many files are analyzed in a background job
+BACKGROUND_MIN_FILES = int(os.getenv('DASHBOARD_BACKGROUND_FILES', '20'))
+POLL_SECONDS = float(os.getenv('DASHBOARD_POLL_SECONDS', '1'))
+# Documents matched per call, so job progress advances during matching too
+MATCH_BATCH_SIZE = 50
+
+
+def _rerun():
+    # st.rerun replaced st.experimental_rerun in newer Streamlit releases
+    (getattr(st, "rerun", None) or st.experimental_rerun)()
+
+
+def _parse_job(uploaded_files, company_info):
+    def run(job):
+        job.progress(0, len(uploaded_files), "Parsing documents")
+        return parse_controls(
+            uploaded_files, company_info,
+            progress_callback=lambda done, total, filename, error: job.progress(done, total, "Parsing documents")
+        )
+    return run
+
+
+def _analysis_job(uploaded_files, company_info, regulations, parse_key):
+    def run(job):
+        # Parsed documents are cached under their own key: a regulation change
+        # re-runs matching without inserting the same documents again
+        parse = get_registry().submit(parse_key, _parse_job(uploaded_files, company_info), background=False)
+        parse.wait()
+        if parse.status == "failed":
+            raise RuntimeError(parse.error)
+        documents = parse.result
+
+        # Each job has its own engine: jobs of different sessions run concurrently
+        match_engine = MatchEngine()
+        tables = []
+        job.progress(0, len(documents), "Matching controls")
+        for start in range(0, len(documents), MATCH_BATCH_SIZE):
+            tables.append(match_engine.match_documents(
+                documents[start:start + MATCH_BATCH_SIZE], regulations,
+                branch=company_info["branch"], columnar=True
+            ))
+            job.progress(min(start + MATCH_BATCH_SIZE, len(documents)), len(documents), "Matching controls")
+        # Gaps come from reverse matching: the best supporting control of every clause
+        job.progress(len(documents), len(documents), "Checking clause coverage")
+        coverage = match_engine.match_coverage(documents, regulations, branch=company_info["branch"])
+        # Columnar results keep the summary and gap analysis vectorized
+        matches = MatchTable.concat(tables) if tables else MatchTable.from_results([], regulations)
+        return {"matches": matches, "coverage": coverage}
+    return run
+
+
+def _upload_key(uploaded_files):
+    # Hashing reads every file; reruns (one per poll while a job runs) reuse the
+    # session's hash until the set of uploads changes
+    identity = tuple((getattr(f, "file_id", None) or f.name, getattr(f, "size", None)) for f in uploaded_files)
+    cached = st.session_state.get("upload_key")
+    if cached and cached[0] == identity:
+        return cached[1]
+    upload_key = hash_uploads(uploaded_files)
+    st.session_state["upload_key"] = (identity, upload_key)
+    return upload_key
+
+
 def show_dashboard():
     st.title("Compliance Dashboard")
-    
+
+    # Start loading the match (and cascade) encoders while the user picks files
+    warm_up()
+
+    company = st.text_input("Company name")
+    branch = st.text_input("Branch", value="Headquarters")
+
     # File upload
     uploaded_files = st.file_uploader(
         "Upload your organization's control documents",
         type=["pdf", "docx", "txt"],
         accept_multiple_files=True
     )
-    
+
     if uploaded_files:
-        # Process files
-        control_texts = parse_controls(uploaded_files)
+        if not company.strip():
+            st.info("Enter the company name to analyze these documents.")
+            return
+        company_info = {"name": company.strip(), "branch": branch.strip() or "Headquarters"}
         regulations = load_regulations()
-        
-        # Analyze compliance
-        match_engine = MatchEngine()
-        analysis_results = match_engine.match_controls_to_regulations(control_texts, regulations)
-        
+
+        # Identical uploads and settings map to the same job, in this session or any other
+        upload_key = _upload_key(uploaded_files)
+        parse_key = f"parse:{upload_key}:{company_info['name']}:{company_info['branch']}"
+        analysis_key = f"analysis:{parse_key}:{as_store(regulations).fingerprint}"
+
+        cached = st.session_state.get("analysis")
+        if cached and cached[0] == analysis_key:
+            analysis_results = cached[1]
+        else:
+            job = get_registry().submit(
+                analysis_key,
+                _analysis_job(uploaded_files, company_info, regulations, parse_key),
+                background=len(uploaded_files) >= BACKGROUND_MIN_FILES
+            )
+            if job.status in ("pending", "running"):
+                st.progress(job.fraction, text=f"{job.stage or 'Queued'}: {job.done}/{job.total or len(uploaded_files)}")
+                time.sleep(POLL_SECONDS)
+                _rerun()
+                return
+            if job.status == "failed":
+                st.error(f"Analysis failed: {job.error.splitlines()[0]}")
+                return
+            analysis_results = job.result
+            st.session_state["analysis"] = (analysis_key, analysis_results)
+
         # Display results
         st.header("Compliance Analysis Results")
-        display_compliance_summary(analysis_results, regulations)
-        
+        display_compliance_summary(analysis_results["matches"], regulations)
+
         st.header("Gap Analysis")
-        display_gap_analysis(analysis_results, regulations)
\ No newline at end of file
+        display_gap_analysis(analysis_results["coverage"], regulations)
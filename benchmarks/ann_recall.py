@@ -0,0 +1,85 @@
+# benchmarks/ann_recall.py
+"""
+Recall@k and latency of the approximate retrieval backends against exact search
+
+Runs on synthetic clustered unit vectors by default so no model is needed:
+
+    python -m benchmarks.ann_recall --clauses 50000 --queries 500
+
+Pass --index-dir to benchmark a persisted clause index (clauses.npy) instead.
+"""
+import argparse
+import json
+import os
+import time
+import numpy as np
+from api.embedding_index import normalize_rows
+from api.match_engine import get_backend
+
+
+def synthetic_embeddings(n_clauses, n_queries, dim, n_topics=200, seed=0):
+    """Clustered unit vectors that look like sentence embeddings of related clauses"""
+    rng = np.random.default_rng(seed)
+    noise = 0.8 / np.sqrt(dim)
+    topics = normalize_rows(rng.normal(size=(n_topics, dim)))
+    clauses = topics[rng.integers(n_topics, size=n_clauses)] + noise * rng.normal(size=(n_clauses, dim))
+    queries = topics[rng.integers(n_topics, size=n_queries)] + noise * rng.normal(size=(n_queries, dim))
+    return normalize_rows(clauses), normalize_rows(queries)
+
+
+def run_backend(name, options, clauses, queries, k, truth):
+    backend = get_backend(name, **options)
+    start = time.perf_counter()
+    backend.build(clauses)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _, indices = backend.search(queries, k)
+    search_seconds = time.perf_counter() - start
+
+    hits = sum(len(set(found) & set(expected)) for found, expected in zip(indices, truth))
+    return {
+        "backend": name,
+        "options": options,
+        "recall_at_k": hits / float(truth.size),
+        "build_seconds": round(build_seconds, 4),
+        "latency_ms_per_query": round(1000 * search_seconds / len(queries), 4)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--clauses", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--index-dir", help="Directory containing a persisted clauses.npy")
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    parser.add_argument("--ef", type=int, nargs="+", default=[16, 32, 64, 128])
+    args = parser.parse_args()
+
+    if args.index_dir:
+        clauses = np.load(os.path.join(args.index_dir, "clauses.npy"), mmap_mode="r")
+        rng = np.random.default_rng(1)
+        picks = rng.choice(clauses.shape[0], min(args.queries, clauses.shape[0]), replace=False)
+        queries = normalize_rows(clauses[picks] + 0.05 * rng.normal(size=(len(picks), clauses.shape[1])))
+    else:
+        clauses, queries = synthetic_embeddings(args.clauses, args.queries, args.dim)
+
+    _, truth = get_backend("exact").build(clauses).search(queries, args.k)
+    report = {"clauses": int(clauses.shape[0]), "queries": int(len(queries)), "k": args.k, "runs": []}
+    report["runs"].append(run_backend("exact", {}, clauses, queries, args.k, truth))
+
+    for nprobe in args.nprobe:
+        report["runs"].append(run_backend("ivf", {"nprobe": nprobe}, clauses, queries, args.k, truth))
+    try:
+        for ef in args.ef:
+            report["runs"].append(run_backend("hnsw", {"ef_search": ef}, clauses, queries, args.k, truth))
+    except ImportError as e:
+        report["skipped"] = str(e)
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
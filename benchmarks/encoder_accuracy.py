@@ -0,0 +1,122 @@
+# benchmarks/encoder_accuracy.py
+"""
+Ranking agreement and throughput of the quantized/ONNX encoders against fp32
+
+    python -m benchmarks.encoder_accuracy --backends torch-int8 onnx onnx-int8 --threads 4
+
+Clauses of the regulation set are ranked for each query with the fp32
+SentenceTransformer and with every candidate backend. Queries are the
+chunks of --documents when given, else the clause texts themselves (a
+clause's own row is excluded from its ranking). Reports top-5 agreement
+(mean overlap of the two top-k sets), top-1 agreement, mean cosine between
+the fp32 and candidate vectors, and encode throughput per backend.
+"""
+import argparse
+import glob
+import json
+import time
+import numpy as np
+from api.chunker import chunk_text
+from api.document_parser import extract_pages_from_file, join_pages
+from api.embedding_index import normalize_rows
+from api.encoders import ENCODER_BACKENDS, create_encoder
+from api.match_engine import top_k_scores
+from api.model_registry import MODEL_NAME, get_model
+from api.regulation_loader import RegulationLoader
+
+
+def encode_timed(encoder, texts, batch_size):
+    start = time.perf_counter()
+    embeddings = normalize_rows(encoder.encode(texts, batch_size=batch_size))
+    return embeddings, time.perf_counter() - start
+
+
+def rank(queries, clauses, k, exclude_self):
+    _, indices = top_k_scores(queries, clauses, k + 1 if exclude_self else k)
+    if not exclude_self:
+        return indices
+    # Drop each query's own clause, keeping the next k
+    own = np.arange(len(queries))[:, None]
+    ranked = [row[row != own[i]][:k] for i, row in enumerate(indices)]
+    return np.array(ranked)
+
+
+def agreement(reference, candidate):
+    k = reference.shape[1]
+    overlap = np.mean([len(set(a) & set(b)) / float(k) for a, b in zip(reference, candidate)])
+    top1 = np.mean(reference[:, 0] == candidate[:, 0])
+    return float(overlap), float(top1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Quantized/ONNX encoder agreement with fp32")
+    parser.add_argument("--model", default=MODEL_NAME)
+    parser.add_argument("--backends", nargs="+", default=["torch-int8", "onnx", "onnx-int8"],
+                        choices=[b for b in ENCODER_BACKENDS if b != "torch"])
+    parser.add_argument("--threads", type=int, help="Intra-op threads for the candidate backends")
+    parser.add_argument("--documents", nargs="*", default=[], help="Control files (globs) to chunk as queries")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    store = RegulationLoader().load_store()
+    clause_texts = store.texts
+    query_texts = []
+    for pattern in args.documents:
+        for path in sorted(glob.glob(pattern, recursive=True)):
+            text, offsets = join_pages(extract_pages_from_file(path))
+            query_texts.extend(chunk["text"] for chunk in chunk_text(text, offsets))
+    exclude_self = not query_texts
+    if exclude_self:
+        query_texts = clause_texts
+
+    reference = get_model(args.model)
+    ref_clauses, ref_clause_seconds = encode_timed(reference, clause_texts, args.batch_size)
+    ref_queries, ref_query_seconds = (ref_clauses, 0.0) if exclude_self else \
+        encode_timed(reference, query_texts, args.batch_size)
+    ref_ranks = rank(ref_queries, ref_clauses, args.k, exclude_self)
+    ref_seconds = ref_clause_seconds + ref_query_seconds
+    encoded = len(clause_texts) + (0 if exclude_self else len(query_texts))
+
+    report = {
+        "model": args.model,
+        "clauses": len(clause_texts),
+        "queries": len(query_texts),
+        "k": args.k,
+        "threads": args.threads,
+        "backends": [{
+            "backend": "torch",
+            "texts_per_s": round(encoded / ref_seconds, 1) if ref_seconds else None
+        }]
+    }
+    for backend in args.backends:
+        try:
+            encoder = create_encoder(args.model, backend, threads=args.threads)
+        except ImportError as e:
+            report["backends"].append({"backend": backend, "error": str(e)})
+            continue
+        clauses, clause_seconds = encode_timed(encoder, clause_texts, args.batch_size)
+        queries, query_seconds = (clauses, 0.0) if exclude_self else \
+            encode_timed(encoder, query_texts, args.batch_size)
+        overlap, top1 = agreement(ref_ranks, rank(queries, clauses, args.k, exclude_self))
+        seconds = clause_seconds + query_seconds
+        report["backends"].append({
+            "backend": backend,
+            f"top{args.k}_agreement": round(overlap, 4),
+            "top1_agreement": round(top1, 4),
+            "mean_cosine_to_fp32": round(float(np.mean(np.sum(clauses * ref_clauses, axis=1))), 4),
+            "texts_per_s": round(encoded / seconds, 1) if seconds else None,
+            "speedup": round(ref_seconds / seconds, 2) if seconds else None
+        })
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
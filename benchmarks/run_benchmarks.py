@@ -0,0 +1,190 @@
+# benchmarks/run_benchmarks.py
+"""
+Throughput, latency and memory of each pipeline stage on synthetic data
+
+    python -m benchmarks.run_benchmarks --scale small --output bench.json
+    python -m benchmarks.run_benchmarks --clauses 100000 --documents 1000 --encoder stub
+
+Stages timed separately: extract_text_from_file, parse_controls,
+match_controls_to_regulations, match_coverage and save_results. Everything runs in a
+temporary directory (database, embedding index and cache), so results
+are comparable across versions and never touch data/. The default stub
+encoder needs no network or model download; use --encoder model to
+include real embedding cost.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Sequence
+
+SCALES = {
+    "small": {"clauses": 1000, "documents": 100},
+    "medium": {"clauses": 10000, "documents": 1000},
+    "large": {"clauses": 100000, "documents": 10000}
+}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far (monotonic)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is bytes on macOS and kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values: Sequence[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = min(len(ordered) - 1, max(0, int(round(q / 100.0 * (len(ordered) - 1)))))
+    return ordered[position]
+
+
+def time_batches(batches: List[Any], run: Callable[[Any], int]) -> Dict[str, float]:
+    """Run each batch, recording its latency; run returns the number of items it processed"""
+    latencies = []
+    items = 0
+    for batch in batches:
+        start = time.perf_counter()
+        items += run(batch)
+        latencies.append(time.perf_counter() - start)
+    total = sum(latencies)
+    return {
+        "items": items,
+        "batches": len(batches),
+        "seconds": round(total, 4),
+        "throughput_per_s": round(items / total, 2) if total else 0.0,
+        "p50_ms": round(1000 * percentile(latencies, 50), 3),
+        "p99_ms": round(1000 * percentile(latencies, 99), 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+
+def split(items: List[Any], size: int) -> List[List[Any]]:
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pipeline stage benchmarks")
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--clauses", type=int, help="Override the scale's clause count")
+    parser.add_argument("--documents", type=int, help="Override the scale's document count")
+    parser.add_argument("--regulations", type=int, default=20)
+    parser.add_argument("--doc-words", type=int, default=600)
+    parser.add_argument("--batch-size", type=int, default=32, help="Documents per timed batch")
+    parser.add_argument("--workers", type=int, default=1, help="parse_controls extraction processes")
+    parser.add_argument("--encoder", choices=["stub", "model"], default="stub")
+    parser.add_argument("--trace", action="store_true", help="Also report api.tracing per-stage spans")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    n_clauses = args.clauses or SCALES[args.scale]["clauses"]
+    n_documents = args.documents or SCALES[args.scale]["documents"]
+    workdir = tempfile.mkdtemp(prefix="checkmate-bench-")
+
+    # Module-level settings are read at import time, so point them at the scratch dir first
+    os.environ["DB_PATH"] = os.path.join(workdir, "compliance.db")
+    os.environ["EMBEDDING_INDEX_DIR"] = os.path.join(workdir, "embeddings")
+    os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(workdir, "embedding_cache.db")
+    os.environ["REGULATIONS_PATH"] = os.path.join(workdir, "regulations.json")
+
+    from api import tracing
+    from api.document_parser import extract_text_from_file, parse_controls
+    from api.match_engine import MatchEngine
+    from api.regulation_store import RegulationStore
+    from benchmarks.synthetic import StubEncoder, UploadedFile, make_regulations, write_documents
+
+    regulations = RegulationStore.compile(make_regulations(n_clauses, args.regulations))
+    paths = write_documents(os.path.join(workdir, "corpus"), n_documents, args.doc_words)
+    company_info = {"name": "BenchCorp", "branch": "HQ"}
+
+    if args.encoder == "stub":
+        engine = MatchEngine(model=StubEncoder(), model_name="benchmark-stub", use_cache=False)
+    else:
+        engine = MatchEngine(use_cache=False)
+
+    if args.trace:
+        tracing.configure(tracing.MemorySink())
+
+    stages = {}
+    stages["extract_text_from_file"] = time_batches(
+        paths, lambda path: (extract_text_from_file(path), 1)[1]
+    )
+
+    documents = []
+
+    def parse(batch):
+        parsed = parse_controls([UploadedFile(p) for p in batch], company_info,
+                                save_dir=os.path.join(workdir, "uploads"), workers=args.workers)
+        documents.extend(parsed)
+        return len(batch)
+
+    stages["parse_controls"] = time_batches(split(paths, args.batch_size), parse)
+
+    start = time.perf_counter()
+    engine.clause_index.build(regulations)
+    stages["clause_index_build"] = {
+        "items": n_clauses,
+        "seconds": round(time.perf_counter() - start, 4),
+        "peak_rss_mb": round(peak_rss_mb(), 1)
+    }
+
+    results = []
+
+    def match(batch):
+        results.extend(engine.match_controls_to_regulations([doc["text"] for doc in batch], regulations))
+        return len(batch)
+
+    stages["match_controls_to_regulations"] = time_batches(split(documents, args.batch_size), match)
+    stages["match_coverage"] = time_batches(
+        split(documents, args.batch_size),
+        lambda batch: (engine.match_coverage(batch, regulations), len(batch))[1]
+    )
+
+    # Results from plain texts carry no document id; attach them so save_results measures inserts
+    for document, result in zip(documents, results):
+        result["document_id"] = document["id"]
+    stages["save_results"] = time_batches(
+        split(results, args.batch_size),
+        lambda batch: (engine.save_results(batch, db_path=os.environ["DB_PATH"]), len(batch))[1]
+    )
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "encoder": args.encoder,
+        "clauses": n_clauses,
+        "regulations": args.regulations,
+        "documents": n_documents,
+        "doc_words": args.doc_words,
+        "batch_size": args.batch_size,
+        "workers": args.workers,
+        "workdir": workdir,
+        "stages": stages,
+        "spans": tracing.summary()
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
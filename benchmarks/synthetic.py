@@ -0,0 +1,93 @@
+# benchmarks/synthetic.py
+"""Synthetic regulation libraries, control documents and an offline stub encoder"""
+import hashlib
+import os
+import random
+from typing import Any, Dict, List
+import numpy as np
+
+VOCABULARY = (
+    "personal data processing lawful fair transparent purpose limitation minimisation accuracy "
+    "storage retention integrity confidentiality encryption access control audit logging "
+    "consent withdrawal breach notification authority customer patient record health financial "
+    "capital adequacy liquidity risk management framework board oversight third party vendor "
+    "outsourcing business continuity disaster recovery testing incident response monitoring "
+    "segregation duties privileged accounts password authentication multi factor network "
+    "firewall vulnerability patch change management backup restore classification labelling "
+    "transfer cross border residency officer appointment training awareness policy review annual"
+).split()
+
+
+def _sentence(rng: random.Random, min_words: int = 8, max_words: int = 20) -> str:
+    words = [rng.choice(VOCABULARY) for _ in range(rng.randint(min_words, max_words))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_regulations(n_clauses: int, n_regulations: int = 20, seed: int = 0) -> Dict[str, Any]:
+    """Regulation library in the regulations.json format with n_clauses spread over n_regulations"""
+    rng = random.Random(seed)
+    regulations = {}
+    for r in range(n_regulations):
+        name = f"REG{r:03d}"
+        count = n_clauses // n_regulations + (1 if r < n_clauses % n_regulations else 0)
+        regulations[name] = {
+            "description": f"Synthetic regulation {r}",
+            "clauses": {f"{name}_{c + 1}": _sentence(rng) for c in range(count)}
+        }
+    return regulations
+
+
+def make_document_text(words: int, rng: random.Random) -> str:
+    """Policy-like text: paragraphs of 3-6 sentences until roughly `words` words"""
+    paragraphs = []
+    total = 0
+    while total < words:
+        paragraph = " ".join(_sentence(rng) for _ in range(rng.randint(3, 6)))
+        paragraphs.append(paragraph)
+        total += len(paragraph.split())
+    return "\n\n".join(paragraphs)
+
+
+def write_documents(directory: str, n_documents: int, words: int, seed: int = 0) -> List[str]:
+    """Write n_documents .txt control files and return their paths"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for i in range(n_documents):
+        path = os.path.join(directory, f"control_{i:05d}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(make_document_text(words, rng))
+        paths.append(path)
+    return paths
+
+
+class StubEncoder:
+    """
+    Deterministic hashed bag-of-words encoder with the SentenceTransformer encode() signature
+    Lets the pipeline run offline; its cost is not representative of a real model.
+    """
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _bucket(self, word: str) -> int:
+        return int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16) % self.dim
+
+    def encode(self, texts, batch_size: int = 32, **kwargs) -> np.ndarray:
+        embeddings = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                embeddings[row, self._bucket(word.strip(".,;:"))] += 1.0
+        return embeddings
+
+
+class UploadedFile:
+    """File-like stand-in for a Streamlit upload backed by a file on disk"""
+
+    def __init__(self, path: str):
+        self.name = os.path.basename(path)
+        self.path = path
+
+    def getbuffer(self) -> bytes:
+        with open(self.path, "rb") as f:
+            return f.read()
@@ -0,0 +1,32 @@
+# tests/conftest.py
+"""
+Shared fixtures: settings are read at import time, so every path points into a
+throwaway directory before any api module is imported, and engines use the
+offline stub encoder.
+"""
+import os
+import tempfile
+
+_WORKDIR = tempfile.mkdtemp(prefix="compliance-tests-")
+os.environ["DB_PATH"] = os.path.join(_WORKDIR, "compliance.db")
+os.environ["EMBEDDING_INDEX_DIR"] = os.path.join(_WORKDIR, "embeddings")
+os.environ["EMBEDDING_CACHE_PATH"] = os.path.join(_WORKDIR, "embedding_cache.db")
+os.environ["BRANCH_SCOPES_PATH"] = os.path.join(_WORKDIR, "branch_scopes.json")
+os.environ["TRACE_SINK"] = ""
+
+import pytest
+
+from benchmarks.synthetic import StubEncoder
+
+
+@pytest.fixture
+def engine(tmp_path, monkeypatch):
+    """MatchEngine over the stub encoder with its own database and clause index"""
+    from api import document_parser
+    from api.embedding_index import ClauseEmbeddingIndex
+    from api.match_engine import MatchEngine
+
+    monkeypatch.setattr(document_parser, "DB_PATH", str(tmp_path / "compliance.db"))
+    engine = MatchEngine(model=StubEncoder(64), model_name="stub", use_cache=False, cascade=None)
+    engine.clause_index = ClauseEmbeddingIndex(engine.model, "stub", index_dir=str(tmp_path / "embeddings"))
+    return engine
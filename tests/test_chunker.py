@@ -0,0 +1,53 @@
+import pytest
+
+from api.chunker import PAGE_SEPARATOR, chunk_text, iter_chunks
+
+PAGES = [
+    (1, "Access control policy.\n\nAll accounts use multi factor authentication.\n\n\nPasswords rotate yearly."),
+    (2, "Backups are encrypted. Restores are tested quarterly.\n\nLogs are kept for one year."),
+    (3, "Vendors are reviewed annually.")
+]
+
+
+def _joined_and_offsets(pages):
+    text, offsets, position = [], [], 0
+    for page, page_text in pages:
+        offsets.append([position, page])
+        text.append(page_text)
+        position += len(page_text) + len(PAGE_SEPARATOR)
+    return PAGE_SEPARATOR.join(text), offsets
+
+
+@pytest.mark.parametrize("mode", ["paragraph", "sentence"])
+@pytest.mark.parametrize("max_words", [3, 8, 160])
+def test_char_offset_points_at_chunk_start(mode, max_words):
+    text, offsets = _joined_and_offsets(PAGES)
+    chunks = chunk_text(text, offsets, mode=mode, max_words=max_words)
+
+    assert [chunk["chunk_index"] for chunk in chunks] == list(range(len(chunks)))
+    for chunk in chunks:
+        first_word = chunk["text"].split()[0]
+        assert text.startswith(first_word, chunk["char_offset"])
+        # The page is the one whose text contains char_offset
+        page = max(page for start, page in offsets if start <= chunk["char_offset"])
+        assert chunk["page"] == page
+
+
+def test_streamed_pages_match_joined_text():
+    text, offsets = _joined_and_offsets(PAGES)
+    assert list(iter_chunks(PAGES, max_words=8)) == chunk_text(text, offsets, max_words=8)
+
+
+def test_long_paragraph_is_split_into_word_windows():
+    words = [f"w{i}" for i in range(50)]
+    chunks = chunk_text(" ".join(words), max_words=10, overlap=0)
+
+    assert all(len(chunk["text"].split()) <= 10 for chunk in chunks)
+    assert chunks[-1]["text"].split()[-1] == "w49"
+    for chunk in chunks:
+        assert " ".join(words).startswith(chunk["text"], chunk["char_offset"])
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        chunk_text("text", mode="page")
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from api.embedding_cache import EmbeddingCache
+
+
+def _total(cache):
+    conn = cache._connect()
+    tracked = conn.execute("SELECT value FROM cache_stats WHERE name = 'size_bytes'").fetchone()[0]
+    actual = conn.execute("SELECT COALESCE(SUM(size_bytes), 0) FROM embeddings").fetchone()[0]
+    assert tracked == actual
+    return tracked
+
+
+@pytest.mark.parametrize("storage, atol", [("float32", 0.0), ("float16", 1e-3), ("int8", 1e-2)])
+def test_round_trip(tmp_path, storage, atol):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), storage=storage)
+    vectors = np.random.default_rng(0).standard_normal((4, 8)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    hashes = [f"h{i}" for i in range(4)]
+
+    stored = cache.put_many("stub", hashes, vectors)
+    found = cache.get_many("stub", hashes + ["missing"])
+
+    assert sorted(found) == hashes
+    for i, h in enumerate(hashes):
+        # A later hit returns exactly what the miss was scored with
+        np.testing.assert_array_equal(found[h], stored[i])
+        np.testing.assert_allclose(found[h], vectors[i], atol=atol)
+    assert cache.get_many("other-model", hashes) == {}
+
+
+def test_overwrite_keeps_size_total(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    cache.put_many("stub", ["a", "b"], np.ones((2, 8), dtype=np.float32))
+    cache.put_many("stub", ["a"], np.zeros((1, 8), dtype=np.float32))
+
+    assert _total(cache) == 2 * 8 * 4
+    np.testing.assert_array_equal(cache.get_many("stub", ["a"])["a"], np.zeros(8, dtype=np.float32))
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    # Room for three 8-dim float32 rows
+    cache = EmbeddingCache(str(tmp_path / "cache.db"), max_mb=3 * 32 / (1024 * 1024))
+    clock = iter(range(100))
+    monkeypatch.setattr("api.embedding_cache.time.time", lambda: float(next(clock)))
+
+    for h in ("a", "b", "c"):
+        cache.put_many("stub", [h], np.ones((1, 8), dtype=np.float32))
+    cache.get_many("stub", ["a"])  # "b" is now the oldest entry
+    cache.put_many("stub", ["d"], np.ones((1, 8), dtype=np.float32))
+
+    assert sorted(cache.get_many("stub", ["a", "b", "c", "d"])) == ["a", "c", "d"]
+    assert _total(cache) == 3 * 32
+
+
+def test_clear(tmp_path):
+    cache = EmbeddingCache(str(tmp_path / "cache.db"))
+    cache.put_many("stub", ["a"], np.ones((1, 8), dtype=np.float32))
+    cache.put_many("other", ["a"], np.ones((1, 8), dtype=np.float32))
+
+    cache.clear("stub")
+    assert cache.get_many("stub", ["a"]) == {}
+    assert list(cache.get_many("other", ["a"])) == ["a"]
+    assert _total(cache) == 32
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+from api import db, document_parser
+from api.match_engine import top_k_indices, top_k_scores
+
+REGULATIONS = {
+    "GDPR": {
+        "description": "General Data Protection Regulation [EU]",
+        "clauses": {
+            "GDPR_1": "Personal data shall be processed lawfully fairly and transparently.",
+            "GDPR_2": "Personal data shall be collected for specified explicit purposes.",
+            "GDPR_3": "Personal data shall be kept secure using encryption."
+        }
+    },
+    "HIPAA": {
+        "description": "Health Insurance Portability and Accountability Act [US]",
+        "clauses": {
+            "HIPAA_1": "Patient health records shall be protected from disclosure.",
+            "HIPAA_2": "Patients may request access to their health records."
+        }
+    }
+}
+
+
+@pytest.mark.parametrize("k", [1, 5, 37, 200])
+def test_top_k_scores_matches_brute_force(k):
+    rng = np.random.default_rng(0)
+    queries = rng.standard_normal((23, 16)).astype(np.float32)
+    matrix = rng.standard_normal((150, 16)).astype(np.float32)
+
+    # Small blocks so the running top-k is merged across several tiles
+    scores, indices = top_k_scores(queries, matrix, k, query_block=7, clause_block=40)
+
+    full = queries @ matrix.T
+    expected = np.argsort(-full, axis=1, kind="stable")[:, :min(k, matrix.shape[0])]
+    np.testing.assert_array_equal(indices, expected)
+    np.testing.assert_allclose(scores, np.take_along_axis(full, expected, axis=1), rtol=1e-5)
+
+
+def test_top_k_scores_without_clauses():
+    scores, indices = top_k_scores(np.ones((3, 4), dtype=np.float32), np.empty((0, 4), dtype=np.float32), 5)
+    assert scores.shape == indices.shape == (3, 0)
+
+
+def test_top_k_indices_best_first():
+    scores = np.array([0.2, 0.9, -1.0, 0.5, 0.7], dtype=np.float32)
+    assert top_k_indices(scores, 3).tolist() == [1, 4, 3]
+    assert top_k_indices(scores, 10).tolist() == [1, 4, 3, 0, 2]
+
+
+def _add_documents(texts, branch="HQ"):
+    document_parser.init_db()
+    conn = db.get_connection(document_parser.DB_PATH)
+    ids = []
+    for i, text in enumerate(texts):
+        cursor = conn.execute(
+            "INSERT INTO documents (company_name, branch_location, original_filename, stored_path, processed_text) "
+            "VALUES (?, ?, ?, ?, ?)",
+            ("TestCorp", branch, f"control_{i}.txt", f"data/controls/control_{i}.txt", text)
+        )
+        ids.append(cursor.lastrowid)
+    conn.commit()
+    return ids
+
+
+def _results():
+    conn = db.get_connection(document_parser.DB_PATH)
+    return conn.execute(
+        "SELECT document_id, regulation_name, clause_id, similarity_score FROM processing_results "
+        "ORDER BY document_id, regulation_name, clause_id"
+    ).fetchall()
+
+
+def _with_clause(regulations, name, clause_id, text):
+    changed = {reg: {**data, "clauses": dict(data["clauses"])} for reg, data in regulations.items()}
+    changed[name]["clauses"][clause_id] = text
+    return changed
+
+
+def test_incremental_match_is_a_no_op_when_nothing_changed(engine):
+    _add_documents(["We encrypt personal data at rest.", "Patients can access their health records."])
+
+    first = engine.incremental_match(REGULATIONS, top_k=2)
+    assert first == {"documents_scored": 2, "pairs_scored": 4, "regulations_removed": []}
+    results = _results()
+    assert len(results) == 8
+
+    second = engine.incremental_match(REGULATIONS, top_k=2)
+    assert second == {"documents_scored": 0, "pairs_scored": 0, "regulations_removed": []}
+    assert _results() == results
+
+
+def test_incremental_match_rescores_only_a_changed_regulation(engine):
+    _add_documents(["We encrypt personal data at rest.", "Patients can access their health records."])
+    engine.incremental_match(REGULATIONS, top_k=2)
+    before = _results()
+
+    changed = _with_clause(REGULATIONS, "HIPAA", "HIPAA_2", "Patients may request access to records within thirty days.")
+    summary = engine.incremental_match(changed, top_k=2)
+    assert summary == {"documents_scored": 2, "pairs_scored": 2, "regulations_removed": []}
+
+    after = _results()
+    assert [row for row in after if row[1] == "GDPR"] == [row for row in before if row[1] == "GDPR"]
+    assert len([row for row in after if row[1] == "HIPAA"]) == 4
+    # The rescored rows match a full run over the changed library
+    full = engine.match_documents(
+        [{"id": doc_id, "text": text} for doc_id, text in db.get_connection(document_parser.DB_PATH).execute(
+            "SELECT id, processed_text FROM documents ORDER BY id").fetchall()],
+        changed, top_k=2, scope=["HIPAA"], per_regulation=True
+    )
+    expected = sorted(
+        (result["document_id"], match["regulation"], match["clause_id"])
+        for result in full for match in result["matches"]
+    )
+    assert [row[:3] for row in after if row[1] == "HIPAA"] == expected
+
+
+def test_incremental_match_drops_results_of_a_removed_regulation(engine):
+    _add_documents(["We encrypt personal data at rest."])
+    engine.incremental_match(REGULATIONS, top_k=2)
+
+    remaining = {"GDPR": REGULATIONS["GDPR"]}
+    summary = engine.incremental_match(remaining, top_k=2)
+    assert summary == {"documents_scored": 0, "pairs_scored": 0, "regulations_removed": ["HIPAA"]}
+    assert {row[1] for row in _results()} == {"GDPR"}
+    state = db.get_connection(document_parser.DB_PATH).execute(
+        "SELECT DISTINCT regulation_name FROM match_state").fetchall()
+    assert state == [("GDPR",)]
+
+
+def test_incremental_match_scores_only_new_documents(engine):
+    _add_documents(["We encrypt personal data at rest."])
+    engine.incremental_match(REGULATIONS, top_k=2)
+
+    new_id, = _add_documents(["Patients can access their health records."])
+    summary = engine.incremental_match(REGULATIONS, top_k=2)
+    assert summary == {"documents_scored": 1, "pairs_scored": 2, "regulations_removed": []}
+    assert len([row for row in _results() if row[0] == new_id]) == 4
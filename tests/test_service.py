@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import pytest
+
+from api.service import MatchService, MicroBatcher
+
+
+class RecordingEngine:
+    """Stands in for MatchEngine and records every call"""
+
+    def __init__(self):
+        self.calls = []
+
+    def match_controls_to_regulations(self, texts, regulations, top_k):
+        self.calls.append((tuple(texts), top_k))
+        return [{'document_id': None, 'control_text': text, 'matches': [], 'top_k': top_k} for text in texts]
+
+
+def _request(body: bytes, headers=None, method="POST", path="/match"):
+    headers = {"Content-Length": str(len(body)), **(headers or {})}
+    lines = [f"{method} {path} HTTP/1.1"] + [f"{name}: {value}" for name, value in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+def _dispatch(raw: bytes, engine=None):
+    async def run():
+        batcher = MicroBatcher(engine or RecordingEngine(), {}, max_batch_size=8, max_wait_ms=5)
+        worker = asyncio.create_task(batcher.run())
+        reader = asyncio.StreamReader()
+        reader.feed_data(raw)
+        reader.feed_eof()
+        try:
+            return await MatchService(batcher)._dispatch(reader)
+        finally:
+            worker.cancel()
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize("body, error", [
+    ({"control_texts": ["a"], "top_k": 0}, "'top_k' must be a positive integer"),
+    ({"control_texts": ["a"], "top_k": -3}, "'top_k' must be a positive integer"),
+    ({"control_texts": ["a"], "top_k": "5"}, "'top_k' must be a positive integer"),
+    ({"control_texts": ["a"], "top_k": 2.5}, "'top_k' must be a positive integer"),
+    ({"control_texts": ["a"], "top_k": True}, "'top_k' must be a positive integer"),
+    ({"control_texts": "a"}, "Provide 'control_texts' as a list of strings"),
+    ({"control_texts": ["a", 1]}, "Provide 'control_texts' as a list of strings"),
+    ([1, 2], "Body must be a JSON object"),
+])
+def test_invalid_body_is_rejected(body, error):
+    engine = RecordingEngine()
+    status, payload = _dispatch(_request(json.dumps(body).encode("utf-8")), engine)
+    assert (status, payload) == (400, {"error": error})
+    assert engine.calls == []
+
+
+@pytest.mark.parametrize("raw, error", [
+    (_request(b"{}", {"Content-Length": "abc"}), "Invalid Content-Length"),
+    (_request(b"{}", {"Content-Length": "-1"}), "Invalid Content-Length"),
+    (_request(b"{}", {"Content-Length": "50"}), "Body shorter than Content-Length"),
+    (_request(b"not json"), "Body must be JSON"),
+    (b"\r\n", "Malformed request line"),
+])
+def test_malformed_request_is_rejected(raw, error):
+    assert _dispatch(raw) == (400, {"error": error})
+
+
+def test_valid_request_is_scored():
+    engine = RecordingEngine()
+    body = json.dumps({"control_texts": ["We encrypt data", " "], "top_k": 3}).encode("utf-8")
+    status, payload = _dispatch(_request(body), engine)
+
+    assert status == 200
+    assert [result["control_text"] for result in payload["results"]] == ["We encrypt data", " "]
+    assert payload["results"][0]["top_k"] == 3
+    assert engine.calls == [(("We encrypt data",), 3)]
+
+
+def test_requests_are_batched_per_top_k():
+    engine = RecordingEngine()
+
+    async def run():
+        batcher = MicroBatcher(engine, {}, max_batch_size=8, max_wait_ms=50)
+        worker = asyncio.create_task(batcher.run())
+        try:
+            return await asyncio.gather(
+                batcher.submit(["a"], 2), batcher.submit(["b"], 5), batcher.submit(["c"], 2)
+            )
+        finally:
+            worker.cancel()
+
+    results = asyncio.run(run())
+    assert [[r["top_k"] for r in item] for item in results] == [[2], [5], [2]]
+    assert sorted(engine.calls) == [(("a", "c"), 2), (("b",), 5)]
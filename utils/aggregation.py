@@ -0,0 +1,105 @@
+# utils/aggregation.py
+"""
+Vectorized coverage and gap statistics over a MatchTable
+
+Every function works on the table's NumPy columns in one pass (sorts and
+bincounts, no per-match Python loop), so 10^5 match rows aggregate in
+milliseconds. Coverage is per clause: a clause in scope is covered when its
+best score over all documents reaches the threshold, and every in-scope
+clause that is not covered is a gap, including clauses no document matched.
+"""
+from typing import Any, Dict
+import numpy as np
+import pandas as pd
+from api.match_table import MatchTable
+
+GAP_THRESHOLD = 0.5  # Consider scores below this as gaps
+
+
+def as_table(analysis_results, regulations) -> MatchTable:
+    """MatchTable for columnar or nested (match_documents) results"""
+    if isinstance(analysis_results, MatchTable):
+        return analysis_results
+    return MatchTable.from_results(analysis_results, regulations)
+
+
+def best_per_clause(table: MatchTable):
+    """
+    Best score, best document and match count for every clause row of the store
+    Returns:
+        (best_score with NaN for unmatched clauses, best_document with -1, match_count)
+    """
+    n_clauses = len(table.store)
+    best_score = np.full(n_clauses, np.nan, dtype=np.float32)
+    best_document = np.full(n_clauses, -1, dtype=np.int64)
+    match_count = np.bincount(table.clause, minlength=n_clauses)
+    if len(table):
+        # Sorted by clause, best score first: the first row of each clause run is its best match
+        order = np.lexsort((-table.score, table.clause))
+        clause = table.clause[order]
+        first = order[np.r_[True, clause[1:] != clause[:-1]]]
+        best_score[table.clause[first]] = table.score[first]
+        best_document[table.clause[first]] = table.doc[first]
+    return best_score, best_document, match_count
+
+
+def clause_coverage(table: MatchTable, threshold: float = GAP_THRESHOLD) -> pd.DataFrame:
+    """One row per in-scope clause: best score and document, match count and whether it is covered"""
+    return summarize(table, threshold)["clauses"]
+
+
+def regulation_coverage(table: MatchTable, threshold: float = GAP_THRESHOLD) -> pd.DataFrame:
+    """One row per regulation: clause count, covered clauses, coverage and mean scores"""
+    return summarize(table, threshold)["regulations"]
+
+
+def summarize(table: MatchTable, threshold: float = GAP_THRESHOLD) -> Dict[str, Any]:
+    """
+    Per-clause coverage, per-regulation coverage and gaps in one pass
+    Returns:
+        {'clauses': DataFrame, 'regulations': DataFrame, 'gaps': DataFrame}
+    """
+    store = table.store
+    n_regulations = len(store.regulation_names)
+    best_score, best_document, match_count = best_per_clause(table)
+
+    rows = table.scope
+    regulation = store.regulation_index[rows]
+    scores = best_score[rows]
+    matched = ~np.isnan(scores)
+    covered = matched & (np.nan_to_num(scores, nan=-np.inf) >= threshold)
+    best_doc = best_document[rows]
+
+    clauses = pd.DataFrame({
+        "regulation": pd.Categorical.from_codes(regulation, store.regulation_names),
+        "clause": np.asarray(store.clause_ids, dtype=object)[rows],
+        "best_score": scores,
+        "best_document": best_doc,
+        "best_document_id": np.where(best_doc >= 0, table.document_ids[np.maximum(best_doc, 0)], -1)
+        if table.n_documents else best_doc,
+        "matches": match_count[rows],
+        "covered": covered
+    })
+
+    clause_total = np.bincount(regulation, minlength=n_regulations)
+    covered_total = np.bincount(regulation, weights=covered, minlength=n_regulations)
+    matched_total = np.bincount(regulation, weights=matched, minlength=n_regulations)
+    best_sum = np.bincount(regulation, weights=np.nan_to_num(scores), minlength=n_regulations)
+    match_regulation = table.regulation
+    match_total = np.bincount(match_regulation, minlength=n_regulations)
+    score_sum = np.bincount(match_regulation, weights=table.score, minlength=n_regulations)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        regulations = pd.DataFrame({
+            "regulation": store.regulation_names,
+            "clauses": clause_total,
+            "covered": covered_total.astype(np.int64),
+            "coverage": covered_total / clause_total,
+            "mean_best_score": best_sum / matched_total,
+            "matches": match_total,
+            "score": score_sum / match_total
+        })
+    # Regulations outside the scope have no clauses to report
+    regulations = regulations[clause_total > 0].reset_index(drop=True)
+
+    gaps = clauses[~covered].sort_values("best_score", na_position="first").reset_index(drop=True)
+    return {"clauses": clauses, "regulations": regulations, "gaps": gaps}